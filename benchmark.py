@@ -0,0 +1,297 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Benchmark das páginas e relatórios, sem navegador:
+#   python benchmark.py --sizes 21613 100000 1000000
+#   python benchmark.py --save-baseline          (grava a referência)
+#   python benchmark.py --sizes 10000000 --repeat 1
+#   python benchmark.py --imports                (tempo de import de cada entrada)
+# Os datasets sintéticos são gerados a partir do kc_house_data.csv e ficam em .bench/.
+# As chamadas do Streamlit são trocadas por um stub que devolve o valor padrão dos widgets.
+
+SOURCE = 'kc_house_data.csv'
+BENCH_DIR = '.bench'
+BASELINE = 'benchmark_baseline.json'
+DEFAULT_SIZES = [21613, 100_000, 1_000_000]
+TOLERANCE = 0.25
+GEN_CHUNK = 500_000
+ENTRY_MODULES = ['dashboard', 'project', 'reports']
+
+
+# checkboxes medidos com o valor padrão (sketch: mediana exata, como no app)
+DEFAULT_CHECKBOXES = {'sketch'}
+
+
+class StreamlitStub:
+    # aceita qualquer chamada do st; widgets devolvem o valor padrão
+    def __getattr__(self, name):
+        return StreamlitStub()
+
+    def __call__(self, *args, **kwargs):
+        return StreamlitStub()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def columns(self, spec, **kwargs):
+        n = spec if isinstance(spec, int) else len(spec)
+        return [StreamlitStub() for _ in range(n)]
+
+    def slider(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return value if value is not None else max_value
+
+    def selectbox(self, label, options, *args, **kwargs):
+        options = list(options)
+        return options[-1] if options else None
+
+    def multiselect(self, label, options, default=None, *args, **kwargs):
+        return list(default or [])
+
+    def checkbox(self, label, value=False, *args, key=None, **kwargs):
+        # liga tabelas e legendas; opções que trocam o cálculo ficam no padrão
+        return value if key in DEFAULT_CHECKBOXES else True
+
+    def number_input(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return value
+
+    def html(self, *args, **kwargs):
+        return None
+
+
+def synthetic_csv(n, folder=BENCH_DIR, source=SOURCE, seed=42):
+    # n linhas sorteadas do csv original, com ids novos (~1% revendidos),
+    # preço e coordenadas levemente perturbados
+    path = os.path.join(folder, 'kc_{}.csv'.format(n))
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(folder, exist_ok=True)
+    base = pd.read_csv(source, dtype={'date': str, 'floors': str})
+    rng = np.random.default_rng(seed)
+
+    tmp = path + '.tmp'
+    first = True
+    for start in range(0, n, GEN_CHUNK):
+        size = min(GEN_CHUNK, n - start)
+        chunk = base.iloc[rng.integers(0, len(base), size)].reset_index(drop=True)
+        ids = np.arange(start, start + size, dtype='int64') + 1_000_000_000
+        resold = rng.random(size) < 0.01
+        ids[resold] = rng.integers(1_000_000_000, 1_000_000_000 + start + size, resold.sum())
+        chunk['id'] = ids
+        chunk['price'] = np.round(chunk['price'] * rng.uniform(0.95, 1.05, size)).astype('int64')
+        chunk['lat'] = np.round(chunk['lat'] + rng.normal(0, 0.002, size), 4)
+        chunk['long'] = np.round(chunk['long'] + rng.normal(0, 0.002, size), 3)
+        chunk.to_csv(tmp, mode='w' if first else 'a', header=first, index=False)
+        first = False
+    os.replace(tmp, path)
+
+    return path
+
+
+def zipcode_boxes(data):
+    # geojson sintético (retângulo de cada zipcode) para o mapa de preços
+    g = pd.DataFrame({'zipcode': np.asarray(data['zipcode']),
+                      'lat': data['lat'].to_numpy(), 'long': data['long'].to_numpy()})
+    g = g.groupby('zipcode').agg(lat_min=('lat', 'min'), lat_max=('lat', 'max'),
+                                 long_min=('long', 'min'), long_max=('long', 'max'))
+    features = []
+    for zipcode, r in g.iterrows():
+        ring = [[r.long_min, r.lat_min], [r.long_max, r.lat_min], [r.long_max, r.lat_max],
+                [r.long_min, r.lat_max], [r.long_min, r.lat_min]]
+        features.append({'type': 'Feature', 'properties': {'ZIP': int(zipcode)},
+                         'geometry': {'type': 'Polygon', 'coordinates': [[[float(x), float(y)] for x, y in ring]]}})
+
+    return json.dumps({'type': 'FeatureCollection', 'features': features})
+
+
+def load_pages():
+    # avisos do modo "bare" do streamlit não interessam aqui
+    warnings.simplefilter('ignore')
+
+    import streamlit
+    import streamlit.logger
+    streamlit.logger.set_log_level(logging.ERROR)
+    stub = StreamlitStub()
+    streamlit.set_page_config = stub
+
+    import dashboard
+    import maps
+    import project
+
+    for module in (dashboard, project):
+        module.st = stub
+    maps.components = stub
+
+    return dashboard, project
+
+
+def cases(path, dashboard, project):
+    # (nome, função a medir); os dados de entrada são carregados fora da medição
+    import dataset
+    import house_data
+    import zipcode_pool
+
+    def get_data():
+        shutil.rmtree(house_data._cache_path(path, True, None), ignore_errors=True)
+        return project.get_data.__wrapped__(path)
+
+    clean = project.get_data.__wrapped__(path).view()
+    base = dashboard.get_data.__wrapped__(path)
+    plain = base.view()
+    raw = dashboard.set_feature(base)
+    geofile = zipcode_boxes(raw)
+
+    return [
+        ('get_data', get_data),
+        ('get_data_cached', lambda: project.get_data.__wrapped__(path)),
+        ('set_feature', lambda: dashboard.set_feature(dataset.Dataset(plain.copy(deep=False)))),
+        ('overview_data', lambda: dashboard.overview_data(raw)),
+        ('portifolio_density', lambda: dashboard.portifolio_density(raw, geofile)),
+        ('commercial_distribution', lambda: dashboard.commercial_distribution(raw)),
+        ('attributes_distribution', lambda: dashboard.attributes_distribution(raw)),
+        ('rel_compra', lambda: project.rel_compra(clean)),
+        ('rel_venda', lambda: project.rel_venda(clean)),
+        ('insights', lambda: project.insights(clean)),
+        ('zipcode_pool', lambda: zipcode_pool.build(clean, None, path, workers=zipcode_pool.WORKERS,
+                                                    names=('purchase', 'sales', 'zipcodes'))),
+    ]
+
+
+def import_profile(module, top=10):
+    # python -X importtime num processo novo. Os imports aparecem depois dos filhos,
+    # com dois espaços por nível; os imports diretos do módulo (nível 1, já com os
+    # filhos no cumulativo) são somados por pacote
+    code = 'import warnings; warnings.simplefilter("ignore"); import ' + module
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    total = 0.0
+    packages = {}
+    pending = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        seconds = int(cumulative) / 1e6
+        if depth == 1:
+            package = name.strip().split('.')[0]
+            pending[package] = pending.get(package, 0) + seconds
+        elif depth == 0:
+            if name.strip() == module:
+                total, packages = seconds, pending
+            pending = {}
+
+    ranking = sorted(packages.items(), key=lambda p: -p[1])
+
+    return total, ranking[:top]
+
+
+def measure(func, repeat):
+    import memo
+
+    times = []
+    for _ in range(repeat):
+        memo.clear()
+        gc.collect()
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+
+    memo.clear()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(times), 'peak_mb': peak / 2 ** 20}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for key, r in results.items():
+        ref = baseline.get(key)
+        if ref is None:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if ref[metric] > 0 and r[metric] > ref[metric] * (1 + tolerance):
+                regressions.append('{} {}: {:.3f} -> {:.3f}'.format(key, metric, ref[metric], r[metric]))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das páginas do Seatle Houses')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', help='funções a medir')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', help='grava os resultados em json')
+    parser.add_argument('--imports', action='store_true', help='só o perfil de import das entradas')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        for module in ENTRY_MODULES:
+            total, ranking = import_profile(module)
+            print('{:>26} {:8.3f} s'.format('import ' + module, total))
+            for package, seconds in ranking:
+                print('{:>26} {:8.3f} s'.format(package, seconds))
+        return 0
+
+    dashboard, project = load_pages()
+
+    results = {}
+    for n in args.sizes:
+        path = synthetic_csv(n)
+        for name, func in cases(path, dashboard, project):
+            if args.only and name not in args.only:
+                continue
+            r = measure(func, args.repeat)
+            results['{}@{}'.format(name, n)] = r
+            print('{:>26} {:>9} rows  {:8.3f} s  {:8.1f} MB'.format(name, n, r['seconds'], r['peak_mb']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print('referência gravada em {}'.format(args.baseline))
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSÃO', line)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
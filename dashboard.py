@@ -1,88 +1,74 @@
-import pandas as pd
-import numpy as np
-import plotly.express as px
 import streamlit as st
-import folium
-import geopandas
-from datetime import datetime
-from re import T
-
-from streamlit_folium import folium_static
-from folium.plugins import MarkerCluster
 
+import dataset
+import figure_cache
+import geo_store
+import house_data
+import maps
+import range_filter
+import summary_cube
+import tables
+import time_series
+import timing
+
+# plotly, folium e geopandas são importados só pelas seções que os usam:
+# a tabela de overview aparece antes de qualquer biblioteca de gráfico/mapa carregar
 st.set_page_config(layout='wide')
 
 # Funções
-@st.cache( allow_output_mutation=True)
-def get_data(path):
-    data = pd.read_csv(path)
-    data['date'] = pd.to_datetime(data['date'])
+@st.experimental_singleton
+def get_data(path, version=None):
+    # version entra só na chave do cache: vendas novas geram uma nova versão
+    # um único dataset somente leitura por processo, compartilhado entre as sessões
+    data = dataset.Dataset(house_data.load_houses(path, clean=False), version)
 
     return data
 
-@st.cache( allow_output_mutation=True )
-def get_geofile( url ):
-    geofile = geopandas.read_file( url )
+def get_geofile( data, version=None ):
+    # geometrias locais (geo_store), já filtradas pelos zipcodes dos dados
+    geofile = geo_store.region_geojson( data, version )
 
     return geofile
 
 def set_feature(data):
-    # Adicionar nova feature
-    data['price_sqft'] = data['price'] / data['sqft_lot']
-        
-    return data
+    # Adicionar nova feature: visão do dataset com price_sqft (calculada uma vez)
+    return data.view('price_sqft')
 
-def overview_data(data):
+@timing.timed('overview_data')
+def overview_data(data, version=None):
     st.title('Seatle Houses Overview')
 
     # filtros
     f_attributes = st.sidebar.multiselect( 'Enter Columns', data.columns)
     f_zipcode = st.sidebar.multiselect('Enter Zipcode', data['zipcode'].unique())
 
-    if (f_attributes != []) & (f_zipcode != []):
-        data = data.loc[ data['zipcode'].isin(f_zipcode), f_attributes ]
-
-    elif (f_attributes == []) & (f_zipcode != []):
-        data = data.loc[ data['zipcode'].isin(f_zipcode), : ]
+    # médias e estatísticas saem do cubo por zipcode, sem varrer os dados a cada filtro
+    cube = summary_cube.build_cube( data, version )
 
-    elif (f_attributes != []) & (f_zipcode == []):
-        data = data.loc[ :, f_attributes ]
+    positions = summary_cube.rows( cube, f_zipcode ) if f_zipcode != [] else None
 
-    else:
-        data = data.copy()
-
-
-    st.dataframe(data, height=300)
+    # só a página visível vai para o navegador; ordenação pelos índices da versão
+    tables.paginated( st, data, version, key='overview', rows=positions,
+                      columns=f_attributes, height=300 )
 
     c1, c2 = st.columns((1,1))
     # Metricas
-    df1 = data[['id','zipcode']].groupby('zipcode').count().reset_index()
-    df2 = data[['price','zipcode']].groupby('zipcode').mean().reset_index()
-    df3 = data[['sqft_living','zipcode']].groupby('zipcode').mean().reset_index()
-    df4 = data[['price_sqft','zipcode']].groupby('zipcode').mean().reset_index()
-
-    # juntando df
-    n1 = pd.merge( df1, df2, on='zipcode', how='inner' )
-    n2 = pd.merge( n1, df3, on='zipcode', how='inner' )
-    df = pd.merge( n2, df4, on='zipcode', how='inner' )
-    df.columns = ['ZIPCODE', 'TOTAL HOUSES', 'PRICE', 'SQFT LIVING','PRICE/SQFT']
-
+    df = summary_cube.averages( cube, f_zipcode )
 
     c1.header('Average Values')
     c1.dataframe(df, height=300)
 
     # Estatística Descritiva
-    df1 = data.describe().T.reset_index()
-    df1.drop(columns=['count', '25%', '75%'], inplace=True)
-    df1.columns = ['ATTRIBUTES','MEAN', 'STD', 'MIN', 'MEDIAN', 'MAX']
-    df1 = df1[['ATTRIBUTES', 'MAX', 'MIN', 'MEAN', 'MEDIAN', 'STD']]
+    df1 = summary_cube.describe( cube, data, f_zipcode, f_attributes )
 
     c2.header('Statistic Descriptive')
     c2.dataframe(df1, height=300)
 
     return None
 
-def portifolio_density(data, geofile):
+@timing.timed('portifolio_density')
+def portifolio_density(data, geofile, version=None):
+    import folium
     
     # Mapa de Densidade de Portifólio 
     st.title('Region Overview')
@@ -90,65 +76,61 @@ def portifolio_density(data, geofile):
     c1, c2 = st.columns((1,1))
     c1.header('Portifolio Density')
 
-    df = data.sample(10)
-
-    # Mapa Base - Folium
-    density_map = folium.Map( location=[ data['lat'].mean(), data['long'].mean() ],
-                default_zoom_start=15)
-
-    marker_cluster = MarkerCluster().add_to( density_map )
-
-    for name, row in df.iterrows():
-        folium.Marker( [row['lat'], row['long']],
-                        popup='Sold R$ {0} on: {1}. Features: {2} sqft, {3} bedrooms, {4} bathrooms, year built: {5}'.format(
-                            row['price'], row['date'], row['sqft_living'],row['bedrooms'],
-                            row['bathrooms'],row['yr_built'])).add_to(marker_cluster)
+    # todos os imóveis agregados numa grade (quantidade, preço e preço/sqft médios
+    # por célula), numa única camada; html em cache por versão
+    with timing.section('density map html') as info:
+        html = maps.grid_map_html( data, version )
+        info['bytes'] = len(html)
 
     with c1:
-        folium_static( density_map )
-
-    region_price_map = folium.Map( location=[ data['lat'].mean(), data['long'].mean() ],
-                default_zoom_start=15)
+        maps.show( html )
 
     # Mapa de preço por região
     c2.header('Price Density')
-
-    df = data[['price','zipcode']].groupby('zipcode').mean().reset_index()
-    df.columns = ['ZIP', 'PRICE']
-
-    geofile = geofile[ geofile['ZIP'].isin( df['ZIP'].tolist())]
-
-    region_price_map = folium.Map( location= [ data['lat'].mean(), data['long'].mean()], 
-                                    default_zoom_start=15 )
-
-    region_price_map.choropleth( data=df,
-                                geo_data= geofile,
-                                columns=['ZIP', 'PRICE'],
-                                key_on='feature.properties.ZIP',
-                                fill_color='YlOrRd',
-                                fill_opacity = 0.7,
-                                line_opacity = 0.2,
-                                legend_name='AVG PRICE')
-
+    if geofile is None:
+        # sem a base local de geometrias (geo_store) só o mapa de densidade aparece
+        return None
+
+    with timing.section('price groupby'):
+        df = data[['price','zipcode']].groupby('zipcode', observed=True).mean().reset_index()
+        df.columns = ['ZIP', 'PRICE']
+
+    with timing.section('price map'):
+        region_price_map = folium.Map( location= [ data['lat'].mean(), data['long'].mean()], 
+                                        default_zoom_start=15 )
+
+        region_price_map.choropleth( data=df,
+                                    geo_data= geofile,
+                                    columns=['ZIP', 'PRICE'],
+                                    key_on='feature.properties.ZIP',
+                                    fill_color='YlOrRd',
+                                    fill_opacity = 0.7,
+                                    line_opacity = 0.2,
+                                    legend_name='AVG PRICE')
+
+    with timing.section('price map html') as info:
+        html = maps.map_html( region_price_map )
+        info['bytes'] = len(html)
 
     with c2:
-        folium_static( region_price_map )
+        maps.show( html )
 
     return None
 
-def commercial_distribution(data):
+@timing.timed('commercial_distribution')
+def commercial_distribution(data, version=None):
+    import plotly.express as px
     # Distribuíção de imóveis por categorias comerciais
 
     st.sidebar.title('Commercial Options')
     st.title('Commercial Attributes')
 
     # Média de preço por ano
-
-    data['date'] = pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d')
+    # os filtros consultam os índices por coluna (range_filter), sem varrer os dados
+    year_index = range_filter.column_index( data, version, 'yr_built', 'price' )
 
     #filtros
-    min_year_built = int(data['yr_built'].min())
-    max_year_built = int(data['yr_built'].max())
+    min_year_built, max_year_built = map(int, range_filter.bounds(year_index))
 
     st.sidebar.subheader('Select Max Year Built')
     f_year_built = st.sidebar.slider('Year Built', min_year_built, 
@@ -157,120 +139,154 @@ def commercial_distribution(data):
     st.header('Average Price per Year Built')
 
     # Seleção de dados
-    df = data.loc[data['yr_built'] <= f_year_built]
-    df = df[['yr_built', 'price']].groupby('yr_built').mean().reset_index()
+    df = range_filter.group_means( year_index, f_year_built )
 
     # plotar gráfico
-    fig = px.line(df, x='yr_built', y='price')
-    st.plotly_chart( fig, use_container_width=True)
+    # figura em cache pelo filtro (figure_cache): mesma seleção, mesma figura
+    with timing.section('yr_built figure'):
+        fig = figure_cache.figure( version, 'yr_built', f_year_built,
+                                   lambda: px.line(df, x='yr_built', y='price') )
+    figure_cache.show(st, fig, 'yr_built')
 
 
     # Média de preço por dia
     st.header('Average Price per Year Built')
     st.sidebar.subheader('Select Max Date')
 
+    # série diária de preço médio, calculada uma vez por versão do dataset
+    daily_price = time_series.daily( data, version, 'price' )
+
     # filtros
-    min_date = datetime.strptime(data['date'].min(),'%Y-%m-%d')
-    max_date = datetime.strptime(data['date'].max(),'%Y-%m-%d')
+    min_date, max_date = time_series.bounds(daily_price)
 
     f_date = st.sidebar.slider('Date', min_date, max_date, max_date)
 
     # Seleção de dados
-    data['date'] = pd.to_datetime(data['date'])
-    df = data.loc[data['date'] <= f_date]
-    df = df[['date', 'price']].groupby('date').mean().reset_index()
+    df = time_series.until( daily_price, f_date )
 
     # plotar gráfico
-    fig = px.line(df, x='date', y='price')
-    st.plotly_chart( fig, use_container_width=True)
+    with timing.section('date figure'):
+        fig = figure_cache.figure( version, 'date', f_date,
+                                   lambda: px.line(df, x='date', y='price') )
+    figure_cache.show(st, fig, 'date')
 
     # Histograma
     st.header('Price Distribution')
     st.sidebar.subheader('Select Max price')
 
+    price_index = range_filter.column_index( data, version, 'price', 'price' )
+
     # filtros
-    min_price = int(data['price'].min())
-    max_price = int(data['price'].max())
-    avg_price = int(data['price'].mean())
+    min_price, max_price = map(int, range_filter.bounds(price_index))
+    avg_price = int(range_filter.mean(price_index))
 
     # Seleção de dados
     f_price = st.sidebar.slider('Price', min_price, max_price, avg_price)
-    df = data.loc[data['price'] <= f_price]
+    df = range_filter.histogram( price_index, f_price, bins=50 )
 
     # plotar gráfico
-    fig = px.histogram(df, x='price', nbins=50 )
-    st.plotly_chart( fig, use_container_width=True)
+    with timing.section('price figure'):
+        fig = figure_cache.figure( version, 'price', f_price,
+                                   lambda: px.bar(df, x='price', y='count').update_layout(bargap=0) )
+    figure_cache.show(st, fig, 'price')
     
     return None
 
-def attributes_distribution(data):
+@timing.timed('attributes_distribution')
+def attributes_distribution(data, version=None):
+    import plotly.express as px
 
     # Distribuição dos imóveis por categorias físicas
     st.header('Attributes Options')
     st.sidebar.subheader('House Attributes')
 
+    bedrooms_index = range_filter.column_index( data, version, 'bedrooms' )
+    bathrooms_index = range_filter.column_index( data, version, 'bathrooms' )
+    floors_index = range_filter.column_index( data, version, 'floors' )
+    waterfront_index = range_filter.column_index( data, version, 'waterfront' )
+
     # filtros
     f_bedrooms = st.sidebar.selectbox('Max number of bedrooms',
-                                    sorted(set(data['bedrooms'].unique())))
+                                    bedrooms_index['keys'].tolist())
     f_bathrooms = st.sidebar.selectbox('Max number of bathrooms',
-                                    sorted(set(data['bathrooms'].unique())))
+                                    bathrooms_index['keys'].tolist())
     f_floors = st.sidebar.selectbox('Max number of floors',
-                                    sorted(set(data['floors'].unique())))
+                                    floors_index['keys'].tolist())
     f_waterview = st.sidebar.checkbox('Only houses with Water View')
 
     c1, c2 = st.columns((1,1))
 
     # Casas por quartos
     c1.header('Houses per bedrooms')
-    df = data[ data['bedrooms'] <= f_bedrooms ]
-    fig = px.histogram(df, x='bedrooms', nbins=19 )
-    c1.plotly_chart( fig, use_container_width=True)
+    df = range_filter.value_counts( bedrooms_index, f_bedrooms )
+    with timing.section('bedrooms figure'):
+        fig = figure_cache.figure( version, 'bedrooms', f_bedrooms,
+                                   lambda: px.histogram(df, x='bedrooms', y='count', nbins=19 ) )
+    figure_cache.show(c1, fig, 'bedrooms')
 
     # Casas por banheiro
     c2.header('Houses per bathrooms')
-    df = data[ data['bathrooms'] <= f_bathrooms ]
-    fig = px.histogram(df, x='bathrooms', nbins=19 )
-    c2.plotly_chart( fig, use_container_width=True)
+    df = range_filter.value_counts( bathrooms_index, f_bathrooms )
+    with timing.section('bathrooms figure'):
+        fig = figure_cache.figure( version, 'bathrooms', f_bathrooms,
+                                   lambda: px.histogram(df, x='bathrooms', y='count', nbins=19 ) )
+    figure_cache.show(c2, fig, 'bathrooms')
 
     c1, c2 = st.columns((1,1))
 
     # Casas por andar
     c1.header('Houses per floor')
-    df = data[ data['floors'] <= f_floors ]
-    fig = px.histogram(df, x='floors', nbins=19 )
-    c1.plotly_chart( fig, use_container_width=True)
+    df = range_filter.value_counts( floors_index, f_floors )
+    with timing.section('floors figure'):
+        fig = figure_cache.figure( version, 'floors', f_floors,
+                                   lambda: px.histogram(df, x='floors', y='count', nbins=19 ) )
+    figure_cache.show(c1, fig, 'floors')
 
     # Casas com vista para água
+    df = range_filter.value_counts( waterfront_index )
     if f_waterview:
-        df = data[ data['waterfront'] == 1 ]
-        
-    else:
-        df = data.copy()
+        df = df[ df['waterfront'] == 1 ]
 
     c2.header('Water Front Houses')
-    fig = px.histogram(df, x='waterfront', nbins=10)
-    c2.plotly_chart( fig, use_container_width=True)
+    with timing.section('waterfront figure'):
+        fig = figure_cache.figure( version, 'waterfront', f_waterview,
+                                   lambda: px.histogram(df, x='waterfront', y='count', nbins=10) )
+    figure_cache.show(c2, fig, 'waterfront')
 
     return None
 
 if __name__ == '__main__':
+    timing.start('dashboard')
+
     # Extração
     path = 'kc_house_data.csv'
-    url = 'https://opendata.arcgis.com/datasets/83fc2e72903343aabff6de8cb445b81c_2.geojson'
     # carregar dados
-    data = get_data(path)
+    with timing.section('load'):
+        version = house_data.dataset_version(path, clean=False)
+        # nova versão: o dataset anterior sai do singleton
+        if dataset.replaces('dashboard', version):
+            get_data.clear()
+        data = get_data(path, version)
+
+        # Transformação
+        data = set_feature( data )
 
-    # carregando goefile
-    geofile = get_geofile( url )
+    overview_data( data, version )
 
-    # Transformação
-    data = set_feature( data )
+    # carregando goefile (só o mapa de preço usa; geopandas carrega aqui)
+    with timing.section('geofile'):
+        try:
+            geofile = get_geofile( data, version )
+        except geo_store.GeoStoreMissing as error:
+            geofile = None
+            st.warning( str(error) )
 
-    overview_data( data )
+    portifolio_density( data, geofile, version )
 
-    portifolio_density( data, geofile )
+    commercial_distribution( data, version )
 
-    commercial_distribution( data )
+    attributes_distribution( data, version )
 
-    attributes_distribution( data )
+    # painel de tempos na barra lateral e exportação (SEATLE_HOUSES_TIMINGS)
+    timing.finish( st )
 
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+
+# Dataset carregado uma vez por processo e compartilhado entre sessões e páginas.
+# Os arrays do frame ficam somente leitura (escritas em posição levantam ValueError)
+# e cada página recebe uma visão rasa: colunas acrescentadas numa visão não aparecem
+# nas outras, e nenhuma cópia do frame é feita. Colunas derivadas ficam no registro
+# DERIVED e são calculadas só quando alguma página pede, uma vez por dataset.
+DERIVED = {}
+
+
+def derived(name):
+    def decorator(func):
+        DERIVED[name] = func
+        return func
+
+    return decorator
+
+
+@derived('price_sqft')
+def price_sqft(data):
+    return data['price'] / data['sqft_lot']
+
+
+def freeze(frame):
+    # marca os arrays dos blocos como somente leitura (categóricas e datas incluídas)
+    for block in frame._mgr.blocks:
+        values = getattr(block.values, '_ndarray', block.values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+
+    return frame
+
+
+class Dataset:
+    def __init__(self, frame, version=None):
+        self._frame = freeze(frame)
+        self._lock = threading.Lock()
+        self.version = version
+
+    def __len__(self):
+        return len(self._frame)
+
+    @property
+    def columns(self):
+        return self._frame.columns
+
+    def view(self, *columns):
+        # visão rasa com as colunas derivadas pedidas; compartilha os arrays do dataset
+        with self._lock:
+            for name in columns:
+                if name not in self._frame.columns:
+                    self._frame[name] = DERIVED[name](self._frame)
+                    freeze(self._frame)
+
+            return self._frame.copy(deep=False)
+
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def replaces(key, version):
+    # True quando key (o get_data de um script) passa para outra versão: o singleton
+    # do streamlit não descarta sozinho o dataset da versão anterior
+    with _versions_lock:
+        changed = key in _versions and _versions[key] != version
+        _versions[key] = version
+
+    return changed
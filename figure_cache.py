@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+import timing
+
+# Figuras plotly prontas, por (versão do dataset, gráfico, valores dos filtros):
+# numa nova execução com os mesmos filtros a figura não é montada de novo (o
+# plotly express é a parte cara). LRU limitado em número de entradas e em bytes
+# (tamanho do json), comum a todas as sessões do processo. Os histogramas chegam
+# aqui já agregados (range_filter), então cada figura leva só as contagens das
+# faixas. O envio usa o st.plotly_chart público com o objeto Figure guardado: ele
+# ainda serializa a figura a cada execução (~2 ms para estes gráficos), mas não a
+# valida de novo, como faria com um dict (~20 ms). As figuras não são alteradas
+# depois de guardadas.
+MAX_ENTRIES = 256
+MAX_BYTES = 32 << 20
+
+_cache = OrderedDict()
+_size = 0
+_lock = threading.Lock()
+
+
+def _entry(fig):
+    # (figura, tamanho do json)
+    return fig, len(fig.to_json())
+
+
+def figure(version, chart, filters, build):
+    # build() monta a figura só na falta; sem version não há cache
+    global _size
+    if version is None:
+        return build()
+
+    key = (version, chart, filters)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key][0]
+
+    entry = _entry(build())
+
+    with _lock:
+        if key not in _cache:
+            _cache[key] = entry
+            _size += entry[1]
+        while len(_cache) > 1 and (len(_cache) > MAX_ENTRIES or _size > MAX_BYTES):
+            _, (_, size) = _cache.popitem(last=False)
+            _size -= size
+
+    return entry[0]
+
+
+def stats():
+    with _lock:
+        return {'entries': len(_cache), 'bytes': _size}
+
+
+def clear():
+    global _size
+    with _lock:
+        _cache.clear()
+        _size = 0
+
+
+def show(target, fig, name, use_container_width=True):
+    # envio da figura ao navegador
+    with timing.section(name + ' plotly_chart'):
+        return target.plotly_chart(fig, use_container_width=use_container_width)
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import memo
+
+# Geometrias dos zipcodes de King County guardadas localmente em GeoParquet,
+# uma versão simplificada por nível de zoom. A importação é feita uma vez, na
+# instalação (os servidores não precisam de acesso à rede):
+#   python geo_store.py [arquivo-ou-url]
+# As páginas só leem a base local; sem ela, levantam GeoStoreMissing.
+SOURCE_URL = 'https://opendata.arcgis.com/datasets/83fc2e72903343aabff6de8cb445b81c_2.geojson'
+GEO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geo')
+ZOOM_LEVELS = (8, 10, 12)
+DEFAULT_ZOOM = 10
+
+
+class GeoStoreMissing(FileNotFoundError):
+    pass
+
+
+def tolerance(zoom):
+    # tamanho aproximado de um pixel em graus no zoom dado
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def _path(zoom, folder):
+    return os.path.join(folder, 'zipcodes.z{}.parquet'.format(zoom))
+
+
+def import_geofile(source=SOURCE_URL, folder=GEO_DIR):
+    # geopandas (mais de 1 s de import) só carrega quando as geometrias são lidas
+    import geopandas
+
+    geofile = geopandas.read_file(source)[['ZIP', 'geometry']]
+    geofile['ZIP'] = geofile['ZIP'].astype('int64')
+
+    os.makedirs(folder, exist_ok=True)
+    for zoom in ZOOM_LEVELS:
+        simple = geofile.copy()
+        simple['geometry'] = simple.geometry.simplify(tolerance(zoom), preserve_topology=True)
+        simple.to_parquet(_path(zoom, folder))
+
+    return geofile
+
+
+def _nearest_zoom(zoom):
+    return min(ZOOM_LEVELS, key=lambda z: abs(z - zoom))
+
+
+def load_geofile(zoom=DEFAULT_ZOOM, folder=GEO_DIR):
+    # nunca busca na rede durante uma requisição
+    path = _path(_nearest_zoom(zoom), folder)
+    if not os.path.exists(path):
+        raise GeoStoreMissing('base local de geometrias não encontrada ({}); importe uma vez com: '
+                              'python geo_store.py [arquivo-ou-url]'.format(path))
+
+    import geopandas
+
+    return geopandas.read_parquet(path)
+
+
+@memo.by_version(pool=memo.VIEWS)
+def region_geojson(data, version=None, zoom=DEFAULT_ZOOM):
+    # GeoJSON só com os zipcodes presentes nos dados, pronto para o choropleth
+    geofile = load_geofile(zoom)
+    zipcodes = data['zipcode'].unique()
+    geofile = geofile[geofile['ZIP'].isin(list(zipcodes))]
+
+    return geofile.to_json()
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE_URL
+    geofile = import_geofile(source)
+    print('{} zipcodes gravados em {}'.format(len(geofile), GEO_DIR))
@@ -0,0 +1,633 @@
+import hashlib
+import json
+import os
+import shutil
+
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import union_categoricals
+
+import schema
+import zipcode_stats
+
+try:
+    import fcntl
+except ImportError:
+    # sem flock (Windows): vale só a verificação do _publish
+    fcntl = None
+
+# Cache colunar dos dados tratados: um arquivo .npy por coluna (memory-mappable)
+# e um manifest.json com a origem, os tipos e a versão do dataset.
+# Os dados são lidos mapeando os arquivos, sem cópia: vários processos do mesmo
+# host (réplicas do streamlit) compartilham as mesmas páginas de memória. Com
+# SEATLE_HOUSES_CACHE=/dev/shm/seatle_houses o cache fica inteiro em RAM.
+CACHE_DIR = '.house_cache'
+CACHE_ROOT = os.environ.get('SEATLE_HOUSES_CACHE')
+MANIFEST = 'manifest.json'
+
+DROP_COLUMNS = ['sqft_living15', 'sqft_lot15']
+
+# Só um cache de um segmento e sem linhas substituídas é lido sem cópia. Com vendas
+# anexadas (ingestão) cada processo junta os segmentos numa cópia própria (memória
+# ~ o dataset por processo) até a compactação, que reescreve o cache inteiro num
+# segmento. Compactar a cada ingestão custaria uma reescrita por lote; o cache só é
+# compactado ao carregar quando passa de COMPACT_SEGMENTS segmentos ou de
+# COMPACT_REMOVED das linhas substituídas, ou pelo compact() (ex.: ao fim de uma
+# carga de vendas, com réplicas e dados grandes). A leitura em chunks já publica o
+# cache compactado.
+COMPACT_SEGMENTS = 16
+COMPACT_REMOVED = 0.1
+
+# arquivos maiores que isso são lidos em chunks (build_cache_chunked)
+STREAM_THRESHOLD = 256 << 20
+CHUNK_ROWS = 500_000
+
+# índice por id usado na leitura em chunks
+AGGREGATE_COLUMNS = ['zipcode', 'price', 'sqft_living', 'sqft_lot']
+INDEX_DTYPES = {
+    'id': 'int64',
+    'date': 'int64',
+    'pos': 'int64',
+    'zipcode': 'int32',
+    'price': 'int32',
+    'sqft_living': 'int32',
+    'sqft_lot': 'int32',
+}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def clean_data(data):
+    # mesmas regras do projeto: remove o outlier de 33 quartos,
+    # as features dos vizinhos e mantém a venda mais recente de cada id
+    # (mesma regra da leitura em chunks e da ingestão: _latest_per_id)
+    data = data.loc[data['bedrooms'] != 33]
+    data = data.drop(columns=[c for c in DROP_COLUMNS if c in data.columns])
+    latest = _latest_per_id({'id': data['id'].to_numpy(),
+                             'date': pd.to_datetime(data['date']).to_numpy().view('int64'),
+                             'pos': np.arange(len(data))})
+    data = data.iloc[np.sort(latest['pos'])]
+
+    return data.reset_index(drop=True)
+
+
+def read_csv(path, clean=True):
+    # tipos do esquema (schema.py), conferidos depois da limpeza
+    data = pd.read_csv(path)
+    data['date'] = pd.to_datetime(data['date'])
+    if clean:
+        data = clean_data(data)
+
+    return schema.apply(data, ranges=clean)
+
+
+def _cache_path(path, clean, cache_dir):
+    variant = 'clean' if clean else 'raw'
+    name = '{}.{}'.format(os.path.basename(path), variant)
+
+    cache_dir = cache_dir or CACHE_ROOT or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+
+    return os.path.join(cache_dir, name)
+
+
+def _read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(folder, manifest):
+    # arquivo temporário por processo: outro processo pode gravar ao mesmo tempo
+    tmp = os.path.join(folder, '{}.tmp{}'.format(MANIFEST, os.getpid()))
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(folder, MANIFEST))
+
+
+def _write_columns(data, folder):
+    os.makedirs(folder)
+
+    columns = []
+    for col in data.columns:
+        s = data[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(folder, col + '.codes.npy'), s.cat.codes.to_numpy())
+            np.save(os.path.join(folder, col + '.categories.npy'), s.cat.categories.to_numpy())
+            columns.append({'name': col, 'kind': 'category'})
+        else:
+            values = s.to_numpy()
+            if values.dtype == object:
+                # textos (ex.: nomes nos agregados) sem pickle
+                values = values.astype(str)
+            np.save(os.path.join(folder, col + '.npy'), values)
+            columns.append({'name': col, 'kind': 'array'})
+
+    return columns
+
+
+def _read_columns(folder, columns, mmap_mode='r'):
+    cols = {}
+    for c in columns:
+        name = c['name']
+        if c['kind'] == 'category':
+            codes = np.load(os.path.join(folder, name + '.codes.npy'), mmap_mode=mmap_mode)
+            categories = np.load(os.path.join(folder, name + '.categories.npy'), allow_pickle=False)
+            cols[name] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            cols[name] = np.load(os.path.join(folder, name + '.npy'), mmap_mode=mmap_mode)
+
+    return cols
+
+
+def write_cache(data, folder, source, version=None):
+    # escreve em um diretório temporário e troca no final
+    tmp = '{}.tmp{}'.format(folder, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = _write_columns(data, os.path.join(tmp, 'seg-00000'))
+    manifest = dict(source, version=version or source['sha1'], schema=schema.VERSION,
+                    rows=len(data), columns=columns,
+                    segments=[{'name': 'seg-00000', 'rows': len(data)}], removed=0)
+    _write_manifest(tmp, manifest)
+
+    return _publish(tmp, folder) or manifest
+
+
+def _compact_columns(folder, manifest, target):
+    # junta os segmentos de folder num segmento em target, sem as linhas removidas,
+    # coluna a coluna: em memória fica só a coluna de um segmento por vez
+    os.makedirs(target)
+    keep = np.ones(sum(s['rows'] for s in manifest['segments']), dtype=bool)
+    keep[_removed_rows(folder, manifest)] = False
+    n = int(keep.sum())
+    bounds = np.cumsum([0] + [s['rows'] for s in manifest['segments']])
+    segments = [os.path.join(folder, s['name']) for s in manifest['segments']]
+
+    for c in manifest['columns']:
+        name = c['name']
+        def values(i, filename):
+            return np.load(os.path.join(segments[i], filename), mmap_mode='r')[keep[bounds[i]:bounds[i + 1]]]
+
+        if c['kind'] == 'category':
+            # categorias só dos valores que ficam, como numa leitura única do csv
+            filename = name + '.codes.npy'
+            parts = [np.load(os.path.join(seg, name + '.categories.npy'), allow_pickle=False) for seg in segments]
+            used = []
+            for i, p in enumerate(parts):
+                codes = values(i, filename)
+                used.append(p[np.unique(codes[codes >= 0])])
+            categories = np.unique(np.concatenate(used))
+            np.save(os.path.join(target, name + '.categories.npy'), categories)
+            dtype = pd.Categorical.from_codes(np.empty(0, dtype='int64'), categories=categories).codes.dtype
+        else:
+            parts = None
+            filename = name + '.npy'
+            dtype = np.load(os.path.join(segments[0], filename), mmap_mode='r').dtype
+
+        out = np.lib.format.open_memmap(os.path.join(target, filename), mode='w+', dtype=dtype, shape=(n,))
+        start = 0
+        for i in range(len(segments)):
+            part = values(i, filename)
+            if parts is not None:
+                # códigos do segmento passam para as categorias do segmento único
+                mapping = np.searchsorted(categories, parts[i])
+                part = np.where(part >= 0, mapping[np.maximum(part, 0)], -1)
+            out[start:start + len(part)] = part
+            start += len(part)
+        out.flush()
+        del out
+
+    return n
+
+
+@contextmanager
+def _locked(folder, shared=False):
+    # um processo por vez monta, compacta ou acrescenta ao cache de uma variante;
+    # os outros esperam e depois usam o cache já publicado. Leitores travam em modo
+    # compartilhado enquanto leem o manifest e mapeiam os arquivos: nenhum escritor
+    # troca ou apaga arquivos no meio da leitura. Depois, o mapeamento continua
+    # válido mesmo que uma compactação apague os arquivos.
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(folder), exist_ok=True)
+    with open(folder + '.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _publish(tmp, folder):
+    # troca o cache pelo diretório montado em tmp (com o cache travado: nenhum
+    # leitor no meio). Se outro processo publicou no meio da troca, o cache dele
+    # fica e o manifest publicado é retornado
+    shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        published = _read_manifest(folder)
+        if published is None:
+            raise
+        shutil.rmtree(tmp, ignore_errors=True)
+        return published
+
+    return None
+
+
+def _removed_rows(folder, manifest):
+    if not manifest.get('removed'):
+        return np.empty(0, dtype='int64')
+
+    return np.load(os.path.join(folder, manifest.get('removed_file', 'removed.npy')))
+
+
+def read_cache(folder, manifest, mmap_mode='r'):
+    segments = [_read_columns(os.path.join(folder, s['name']), manifest['columns'], mmap_mode)
+                for s in manifest['segments']]
+    if len(segments) == 1 and not manifest.get('removed'):
+        # copy=False: cada coluna continua sendo o arquivo mapeado (sem consolidar em blocos)
+        return pd.DataFrame(segments[0], copy=False)
+
+    # segmentos anexados: concatena e retira as vendas substituídas
+    cols = {}
+    for c in manifest['columns']:
+        parts = [seg[c['name']] for seg in segments]
+        if c['kind'] == 'category':
+            cols[c['name']] = union_categoricals(parts, sort_categories=True)
+        else:
+            cols[c['name']] = np.concatenate(parts)
+
+    data = pd.DataFrame(cols)
+    removed = _removed_rows(folder, manifest)
+    if len(removed):
+        keep = np.ones(len(data), dtype=bool)
+        keep[removed] = False
+        data = data.loc[keep].reset_index(drop=True)
+
+    return data
+
+
+def _source_info(path, sha1=None):
+    st = os.stat(path)
+
+    return {'source': os.path.abspath(path),
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'sha1': sha1 or file_hash(path)}
+
+
+def _fresh_manifest(path, folder):
+    # retorna o manifest se o cache ainda corresponde ao csv
+    manifest = _read_manifest(folder)
+    if manifest is None or manifest.get('schema') != schema.VERSION:
+        return None
+
+    st = os.stat(path)
+    if (manifest['mtime_ns'], manifest['size']) == (st.st_mtime_ns, st.st_size):
+        return manifest
+
+    # mtime mudou (ex.: checkout/cópia): só invalida se o conteúdo mudou
+    if manifest['size'] == st.st_size and manifest['sha1'] and manifest['sha1'] == file_hash(path):
+        manifest['mtime_ns'] = st.st_mtime_ns
+        _write_manifest(folder, manifest)
+        return manifest
+
+    return None
+
+
+class _HashingReader:
+    # calcula o sha1 do arquivo enquanto o pandas lê os chunks
+    def __init__(self, f):
+        self.f = f
+        self.sha1 = hashlib.sha1()
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        self.sha1.update(chunk)
+        return chunk
+
+    def __iter__(self):
+        return iter(self.f)
+
+
+def _latest_per_id(index):
+    # uma entrada por id: a venda mais recente (empate: a que aparece por último)
+    order = np.lexsort((index['pos'], index['date'], index['id']))
+    ids = index['id'][order]
+    last = np.append(ids[1:] != ids[:-1], True)
+
+    return {k: v[order[last]] for k, v in index.items()}
+
+
+def build_cache_chunked(path, clean=True, cache_dir=None, chunksize=CHUNK_ROWS):
+    # Monta o cache colunar lendo o csv em chunks: cada chunk tratado vira um
+    # segmento em disco e só um índice compacto por id fica em memória
+    # (id, data, posição e as colunas dos agregados por zipcode).
+    # Chamado com o cache travado (load_houses).
+    folder = _cache_path(path, clean, cache_dir)
+    tmp = '{}.tmp{}'.format(folder, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # os chunks vão para chunks/ e são compactados num segmento antes da troca:
+    # o cache publicado é lido sem cópia (memória compartilhada entre processos)
+    chunks = os.path.join(tmp, 'chunks')
+    os.makedirs(chunks)
+
+    index = {k: np.empty(0, dtype=dt) for k, dt in INDEX_DTYPES.items()}
+    segments = []
+    columns = None
+    offset = 0
+
+    with open(path, 'rb') as f:
+        reader = _HashingReader(f)
+        for chunk in pd.read_csv(reader, chunksize=chunksize):
+            chunk['date'] = pd.to_datetime(chunk['date'])
+            if clean:
+                chunk = chunk.loc[chunk['bedrooms'] != 33]
+                chunk = chunk.drop(columns=[c for c in DROP_COLUMNS if c in chunk.columns])
+            chunk = schema.apply(chunk.reset_index(drop=True), ranges=clean)
+
+            name = 'seg-{:05d}'.format(len(segments))
+            columns = _write_columns(chunk, os.path.join(chunks, name))
+            segments.append({'name': name, 'rows': len(chunk)})
+
+            entries = {'id': chunk['id'].to_numpy(),
+                       'date': chunk['date'].to_numpy().view('int64'),
+                       'pos': np.arange(offset, offset + len(chunk))}
+            for col in INDEX_DTYPES:
+                if col not in entries:
+                    entries[col] = np.asarray(chunk[col]).astype(INDEX_DTYPES[col])
+            index = {k: np.concatenate([index[k], entries[k]]) for k in index}
+            if clean:
+                index = _latest_per_id(index)
+            offset += len(chunk)
+
+    removed = np.setdiff1d(np.arange(offset), index['pos'])
+    np.save(os.path.join(chunks, 'removed.npy'), removed)
+    rows = 0
+    if segments:
+        rows = _compact_columns(chunks, {'segments': segments, 'columns': columns, 'removed': len(removed)},
+                                os.path.join(tmp, 'seg-00000'))
+    shutil.rmtree(chunks)
+
+    # agregados por zipcode calculados só a partir do índice
+    aggregates = zipcode_stats.zipcode_index(pd.DataFrame({c: index[c] for c in AGGREGATE_COLUMNS}))
+    agg_columns = _write_columns(aggregates, os.path.join(tmp, 'aggregates', 'zipcode_index'))
+
+    sha1 = reader.sha1.hexdigest()
+    manifest = dict(_source_info(path, sha1=sha1), clean=clean, version=sha1, schema=schema.VERSION,
+                    rows=rows, columns=columns or [],
+                    segments=[{'name': 'seg-00000', 'rows': rows}] if segments else [], removed=0,
+                    aggregates={'zipcode_index': agg_columns})
+    _write_manifest(tmp, manifest)
+
+    return _publish(tmp, folder) or manifest
+
+
+def load_aggregate(path, name, clean=True, cache_dir=None):
+    # agregados gravados pelo build_cache_chunked (None se não existirem)
+    folder = _cache_path(path, clean, cache_dir)
+    with _locked(folder, shared=True):
+        manifest = _fresh_manifest(path, folder)
+        if manifest is None or name not in manifest.get('aggregates', {}):
+            return None
+        agg = os.path.join(folder, 'aggregates', name)
+
+        return pd.DataFrame(_read_columns(agg, manifest['aggregates'][name], mmap_mode=None))
+
+
+def store_aggregates(path, version, frames, clean=True, cache_dir=None):
+    # grava agregados ({nome: DataFrame}) junto do cache, se ele ainda estiver na
+    # versão para a qual foram calculados; retorna se gravou
+    folder = _cache_path(path, clean, cache_dir)
+    with _locked(folder):
+        manifest = _fresh_manifest(path, folder)
+        if manifest is None or _version(manifest['version'], clean) != version:
+            return False
+
+        aggregates = dict(manifest.get('aggregates', {}))
+        for name, frame in frames.items():
+            target = os.path.join(folder, 'aggregates', name)
+            shutil.rmtree(target, ignore_errors=True)
+            aggregates[name] = _write_columns(frame, target)
+        _write_manifest(folder, dict(manifest, aggregates=aggregates))
+
+    return True
+
+
+def compact_cache(folder, manifest):
+    # junta os segmentos anexados, já sem as vendas substituídas, num segmento só:
+    # a leitura volta a ser só o mapeamento dos arquivos, compartilhado entre processos
+    tmp = '{}.tmp{}'.format(folder, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    rows = _compact_columns(folder, manifest, os.path.join(tmp, 'seg-00000'))
+    if manifest.get('aggregates'):
+        # agregados que continuam valendo são copiados do cache atual
+        shutil.copytree(os.path.join(folder, 'aggregates'), os.path.join(tmp, 'aggregates'))
+    manifest = dict(manifest, rows=rows, segments=[{'name': 'seg-00000', 'rows': rows}], removed=0)
+    manifest.pop('removed_file', None)
+    _write_manifest(tmp, manifest)
+
+    return _publish(tmp, folder) or manifest
+
+
+def needs_compaction(manifest):
+    removed = manifest.get('removed', 0)
+    total = manifest['rows'] + removed
+
+    return len(manifest['segments']) > COMPACT_SEGMENTS or (total > 0 and removed / total > COMPACT_REMOVED)
+
+
+def compact(path, clean=True, cache_dir=None):
+    # compactação explícita (ex.: depois de uma carga grande de vendas)
+    folder = _cache_path(path, clean, cache_dir)
+    with _locked(folder):
+        manifest = _fresh_manifest(path, folder)
+        if manifest is not None and (len(manifest['segments']) > 1 or manifest.get('removed')):
+            manifest = compact_cache(folder, manifest)
+
+    return manifest
+
+
+def load_houses(path, clean=True, cache_dir=None):
+    folder = _cache_path(path, clean, cache_dir)
+    with _locked(folder, shared=True):
+        manifest = _fresh_manifest(path, folder)
+        if manifest is not None and not needs_compaction(manifest):
+            return read_cache(folder, manifest)
+
+    with _locked(folder):
+        # outro processo pode ter montado o cache enquanto este esperava
+        manifest = _fresh_manifest(path, folder)
+        if manifest is None and os.path.getsize(path) >= STREAM_THRESHOLD:
+            manifest = build_cache_chunked(path, clean=clean, cache_dir=cache_dir)
+        elif manifest is None:
+            data = read_csv(path, clean=clean)
+            manifest = write_cache(data, folder, dict(_source_info(path), clean=clean))
+
+        if needs_compaction(manifest):
+            manifest = compact_cache(folder, manifest)
+
+        return read_cache(folder, manifest)
+
+
+def _version(sha1, clean):
+    return '{}:{}'.format(sha1[:16], 'clean' if clean else 'raw')
+
+
+def dataset_version(path, clean=True, cache_dir=None):
+    folder = _cache_path(path, clean, cache_dir)
+    manifest = _fresh_manifest(path, folder)
+    sha1 = manifest['version'] if manifest else file_hash(path)
+
+    return _version(sha1, clean)
+
+
+def _csv_rows(new_rows, columns):
+    # linhas novas no formato do csv original
+    rows = new_rows.reindex(columns=columns)
+    if np.issubdtype(rows['date'].dtype, np.datetime64):
+        rows['date'] = rows['date'].dt.strftime('%Y%m%dT%H%M%S')
+
+    return rows.to_csv(header=False, index=False, lineterminator='\n').encode()
+
+
+def _append_segment(folder, manifest, batch, source, dedupe):
+    # grava o lote como novo segmento e, nos dados tratados, fica só a venda mais
+    # recente de cada id (empate: a que vem depois no arquivo). Retorna as posições
+    # das vendas anteriores substituídas e as do lote que já chegam substituídas
+    segments = manifest['segments']
+    removed = _removed_rows(folder, manifest)
+    losers = np.empty(0, dtype='int64')
+    offset = sum(s['rows'] for s in segments)
+
+    if dedupe:
+        def column(name):
+            return np.concatenate([np.load(os.path.join(folder, s['name'], name + '.npy'), mmap_mode='r')
+                                   for s in segments])
+
+        old_ids = column('id')
+        same = np.setdiff1d(np.flatnonzero(np.isin(old_ids, batch['id'].to_numpy())), removed)
+        candidates = {'id': np.concatenate([old_ids[same], batch['id'].to_numpy()]),
+                      'date': np.concatenate([column('date')[same], batch['date'].to_numpy()]).view('int64'),
+                      'pos': np.concatenate([same, offset + np.arange(len(batch))])}
+        losers = np.setdiff1d(candidates['pos'], _latest_per_id(candidates)['pos'])
+
+    name = 'seg-{:05d}'.format(len(segments))
+    shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+    _write_columns(batch[[c['name'] for c in manifest['columns']]], os.path.join(folder, name))
+
+    # removed-<segmentos>.npy: um arquivo por geração do manifest, o anterior não é
+    # sobrescrito (quem ainda tem o manifest anterior lê o arquivo dele)
+    removed = np.union1d(removed, losers)
+    previous = manifest.get('removed_file')
+    removed_file = 'removed-{:05d}.npy'.format(len(segments) + 1)
+    np.save(os.path.join(folder, removed_file), removed)
+
+    manifest = dict(manifest, **source)
+    # agregados gravados na leitura em chunks deixam de valer
+    manifest.pop('aggregates', None)
+    manifest['segments'] = segments + [{'name': name, 'rows': len(batch)}]
+    manifest['rows'] = manifest['rows'] + len(batch) - len(losers)
+    manifest['removed'] = len(removed)
+    manifest['removed_file'] = removed_file
+    _write_manifest(folder, manifest)
+    if previous and previous != removed_file:
+        os.remove(os.path.join(folder, previous))
+
+    return losers[losers < offset], losers[losers >= offset] - offset
+
+
+def _rows_at(folder, manifest, positions):
+    # linhas nas posições globais (antes da remoção), lidas só dos segmentos envolvidos
+    parts = []
+    offset = 0
+    for s in manifest['segments']:
+        local = positions[(positions >= offset) & (positions < offset + s['rows'])] - offset
+        if len(local):
+            cols = _read_columns(os.path.join(folder, s['name']), manifest['columns'])
+            parts.append(pd.DataFrame({name: np.asarray(col)[local] for name, col in cols.items()}))
+        offset += s['rows']
+
+    if not parts:
+        return pd.DataFrame(columns=[c['name'] for c in manifest['columns']])
+
+    return pd.concat(parts, ignore_index=True)
+
+
+def append_sales(path, new_rows, cache_dir=None, version=None):
+    # Acrescenta vendas novas ao csv e aos caches colunares em dia, sem reprocessar
+    # o arquivo. Retorna, por variante, as linhas acrescentadas e as substituídas.
+    # As duas variantes ficam travadas até o fim: nenhum processo remonta o cache
+    # a partir do csv já alterado antes de os segmentos novos serem gravados.
+    # version: versão dos dados tratados sobre a qual o lote é aplicado (quem
+    # atualiza agregados a partir da diferença); se o cache mudou, nada é gravado.
+    with _locked(_cache_path(path, True, cache_dir)), _locked(_cache_path(path, False, cache_dir)):
+        return _append_sales(path, new_rows, cache_dir, version)
+
+
+def _append_sales(path, new_rows, cache_dir=None, version=None):
+    fresh = {}
+    for clean in (True, False):
+        folder = _cache_path(path, clean, cache_dir)
+        manifest = _fresh_manifest(path, folder)
+        if manifest is not None:
+            fresh[clean] = (folder, manifest)
+
+    if version is not None and True in fresh and _version(fresh[True][1]['version'], True) != version:
+        raise ValueError('o dataset mudou durante a ingestão (versão {}, esperada {})'.format(
+            _version(fresh[True][1]['version'], True), version))
+
+    # o lote é conferido antes de tocar no csv: nada é gravado com valores inválidos
+    schema.validate(new_rows, ranges=False)
+    schema.validate(clean_data(new_rows), ranges=True)
+
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    payload = _csv_rows(new_rows, columns)
+    with open(path, 'rb+') as f:
+        # garante a quebra de linha antes das novas linhas
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(payload)
+
+    changes = {}
+    for clean, (folder, manifest) in fresh.items():
+        batch = new_rows.copy()
+        batch['date'] = pd.to_datetime(batch['date'])
+        batch = schema.apply(clean_data(batch) if clean else batch.reset_index(drop=True), ranges=clean)
+
+        # versão encadeada: versão anterior + bytes acrescentados
+        st = os.stat(path)
+        source = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha1': None,
+                  'version': hashlib.sha1((manifest['version'] + ':').encode() + payload).hexdigest()}
+
+        superseded, stale = _append_segment(folder, manifest, batch, source, dedupe=clean)
+        removed = _rows_at(folder, manifest, superseded)
+        # vendas do lote mais antigas que a já gravada do mesmo id não entram
+        batch = batch.drop(index=batch.index[stale]).reset_index(drop=True)
+
+        changes['clean' if clean else 'raw'] = (batch, removed)
+
+    return changes
@@ -0,0 +1,119 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+import memo
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# hipóteses binárias: nome -> (coluna, operador, valor). O grupo 1 são os
+# imóveis em que a condição é verdadeira.
+HYPOTHESES = {}
+
+
+def register(name, column, op, value):
+    if op not in OPERATORS:
+        raise ValueError('operador inválido: {}'.format(op))
+    HYPOTHESES[name] = (column, op, value)
+
+
+register('waterfront', 'waterfront', '==', 1)
+register('basement', 'sqft_basement', '!=', 0)
+register('ground', 'floors', '<=', 1)
+register('twobedrooms', 'bedrooms', '<=', 2)
+register('onebath', 'bathrooms', '<=', 1)
+
+
+def flags(data, hypotheses):
+    rows = [OPERATORS[op](data[column].to_numpy(), value) for _, (column, op, value) in hypotheses]
+
+    return [name for name, _ in hypotheses], np.vstack(rows)
+
+
+def summary(data, version=None):
+    # as hipóteses registradas fazem parte da chave do cache
+    return _summary(data, version, tuple(HYPOTHESES.items()))
+
+
+def _counts(data, hypotheses):
+    # contagens e somas de preço dos dois grupos (decomponíveis)
+    names, mask = flags(data, hypotheses)
+    price = data['price'].to_numpy(dtype='float64')
+
+    count_1 = mask.sum(axis=1)
+    sum_1 = mask.astype('float64') @ price
+
+    return names, len(price) - count_1, count_1, price.sum() - sum_1, sum_1
+
+
+def _summary_frame(names, count_0, count_1, sum_0, sum_1):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df = pd.DataFrame({'hypothesis': names,
+                           'count_0': count_0,
+                           'count_1': count_1,
+                           'price_0': sum_0 / count_0,
+                           'price_1': sum_1 / count_1,
+                           'sum_0': sum_0,
+                           'sum_1': sum_1})
+    df['ratio'] = df['price_1'] / df['price_0']
+
+    return df.set_index('hypothesis')
+
+
+@memo.by_version
+def _summary(data, version, hypotheses):
+    # média de preço dos dois grupos de todas as hipóteses em uma única passada
+    return _summary_frame(*_counts(data, hypotheses))
+
+
+def update_summary(summary, added, removed):
+    # resumo do dataset novo: soma as vendas acrescentadas e subtrai as substituídas
+    hyps = tuple((name, HYPOTHESES[name]) for name in summary.index)
+    totals = [summary[c].to_numpy(dtype='float64').copy() for c in ('count_0', 'count_1', 'sum_0', 'sum_1')]
+
+    for rows, sign in ((added, 1), (removed, -1)):
+        if len(rows):
+            _, *delta = _counts(rows, hyps)
+            for total, d in zip(totals, delta):
+                total += sign * d
+
+    count_0, count_1, sum_0, sum_1 = totals
+
+    return _summary_frame(list(summary.index), count_0.astype('int64'), count_1.astype('int64'), sum_0, sum_1)
+
+
+def store_summary(version, summary):
+    # resumo já calculado (ingestão, cache) no memo, na chave que summary usa
+    memo.store(_summary, version, summary, tuple(HYPOTHESES.items()))
+
+
+def to_frame(summary):
+    # resumo com a definição de cada hipótese, para gravar junto do cache
+    frame = summary.reset_index()
+    frame['definition'] = [repr(HYPOTHESES[name]) for name in frame['hypothesis']]
+
+    return frame
+
+
+def from_frame(frame, data=None):
+    # resumo gravado; só vale se as hipóteses registradas forem as mesmas
+    expected = [(name, repr(definition)) for name, definition in HYPOTHESES.items()]
+    if list(zip(frame['hypothesis'], frame['definition'])) != expected:
+        return None
+
+    return frame.drop(columns='definition').set_index('hypothesis')
+
+
+def group_means(summary, name):
+    # tabela no formato do gráfico: coluna da hipótese (0/1) e preço médio
+    row = summary.loc[name]
+
+    return pd.DataFrame({name: [0, 1], 'price': [row['price_0'], row['price_1']]})
@@ -0,0 +1,102 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+import house_data
+import hypotheses
+import memo
+import price_sketch
+import zipcode_stats
+
+# Ingestão incremental de vendas novas:
+#   python ingest.py kc_house_data.csv novas_vendas.csv
+# As vendas são acrescentadas ao csv e ao cache colunar (novo segmento), com as
+# mesmas regras de limpeza. Os agregados da versão anterior (índice por zipcode,
+# sketch das medianas e resumo dos insights) são atualizados a partir da diferença
+# e gravados junto do cache: os processos do streamlit os carregam no memo da nova
+# versão (seed_aggregates) em vez de recalcular tudo.
+
+
+def _index_from_frame(frame, data):
+    # o índice gravado só vale para as mesmas categorias de zipcode dos dados
+    _, categories = zipcode_stats.zipcode_codes(data)
+    if not np.array_equal(frame['zipcode'].to_numpy(), np.asarray(categories)):
+        return None
+
+    return frame
+
+
+def _store_index(version, index):
+    memo.store(zipcode_stats.zipcode_index, version, index)
+
+
+def _sketch(data, version):
+    return price_sketch.build(data, version, price_sketch.DEFAULT_ERROR)
+
+
+def _update_summary(summary, data, added, removed):
+    return hypotheses.update_summary(summary, added, removed)
+
+
+# nome -> (cálculo, atualização, grava no memo, valor -> frame, (frame, dados) -> valor ou None)
+AGGREGATES = {
+    'zipcode_index': (zipcode_stats.zipcode_index, zipcode_stats.update_index, _store_index,
+                      lambda index: index, _index_from_frame),
+    'price_sketch': (_sketch, price_sketch.update, price_sketch.store,
+                     price_sketch.to_frame, price_sketch.from_frame),
+    'hypotheses': (hypotheses.summary, _update_summary, hypotheses.store_summary,
+                   hypotheses.to_frame, hypotheses.from_frame),
+}
+
+
+def seed_aggregates(path, version, data):
+    # agregados gravados junto do cache (leitura em chunks, ingestão) entram no memo
+    # da versão: quem pede o índice por zipcode, o sketch ou o resumo não varre as linhas
+    seeded = []
+    for name, (_, _, store, _, from_frame) in AGGREGATES.items():
+        frame = house_data.load_aggregate(path, name)
+        value = from_frame(frame, data) if frame is not None else None
+        if value is not None and version is not None:
+            store(version, value)
+            seeded.append(name)
+
+    return seeded
+
+
+def read_batch(path):
+    return pd.read_csv(path)
+
+
+def ingest(path, new_rows, data=None, version=None):
+    # data/version: dados tratados já carregados (o app); sem eles, lê o cache e
+    # usa os agregados gravados (ou os calcula uma vez)
+    if data is None or version is None:
+        version = house_data.dataset_version(path)
+        data = house_data.load_houses(path)
+        seed_aggregates(path, version, data)
+    previous = {name: compute(data, version) for name, (compute, *_) in AGGREGATES.items()}
+
+    changes = house_data.append_sales(path, new_rows, version=version)
+    new_version = house_data.dataset_version(path)
+
+    if 'clean' in changes:
+        added, removed = changes['clean']
+        new_data = house_data.load_houses(path)
+
+        # cada agregado soma as vendas acrescentadas e subtrai as substituídas
+        frames = {}
+        for name, (_, update, store, to_frame, _) in AGGREGATES.items():
+            value = update(previous[name], new_data, added, removed)
+            store(new_version, value)
+            frames[name] = to_frame(value)
+        house_data.store_aggregates(path, new_version, frames)
+
+    return new_version
+
+
+if __name__ == '__main__':
+    path, batch = sys.argv[1], sys.argv[2]
+    rows = read_batch(batch)
+    version = ingest(path, rows)
+    print('{} vendas acrescentadas a {} (versão {})'.format(len(rows), path, version))
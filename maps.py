@@ -0,0 +1,124 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import streamlit.components.v1 as components
+
+import memo
+import spatial_bins
+
+# Os marcadores são criados no navegador a partir de uma lista de linhas
+# [lat, long, campos do popup...]; o texto do popup é montado pelo callback JS.
+MARKER_CALLBACK = """
+function (row) {
+    var money = function (v) {
+        return v.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    };
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(%s);
+    return marker;
+}
+"""
+
+# popups dos relatórios: (colunas enviadas, expressão JS sobre row[2:])
+PURCHASE_POPUP = (('price', 'date', 'sqft_living', 'bedrooms', 'bathrooms', 'yr_built'),
+                  "'Sold $ ' + money(row[2]) + ' on: ' + row[3] + '. Features: ' + row[4] + ' sqft, '"
+                  " + row[5] + ' bedrooms, ' + row[6] + ' bathrooms, year built: ' + row[7]")
+
+SALES_POPUP = (('sales_price', 'profit', 'sqft_living', 'bedrooms', 'bathrooms', 'yr_built'),
+               "'Sales price $ ' + money(row[2]) + ', and profit ' + money(row[3]) + '. Features: '"
+               " + row[4] + ' sqft, ' + row[5] + ' bedrooms, ' + row[6] + ' bathrooms, year built: ' + row[7]")
+
+
+def frame_key(df, columns=()):
+    # identifica o conjunto exibido pelos ids, pelas colunas e pelos valores que vão
+    # para o mapa (posição e popup): uma venda nova ou outra mediana muda a chave
+    # mesmo sem mudar os ids
+    h = hashlib.sha1(np.ascontiguousarray(df['id'].to_numpy()).tobytes())
+    h.update(repr(tuple(columns)).encode())
+    shown = df[['lat', 'long'] + list(columns)]
+    h.update(pd.util.hash_pandas_object(shown, index=False).to_numpy().tobytes())
+
+    return h.hexdigest()
+
+
+def _column_values(s):
+    # colunas viram listas python prontas para o json do mapa
+    if np.issubdtype(s.dtype, np.datetime64):
+        return np.datetime_as_string(s.to_numpy(), unit='D').tolist()
+    if np.issubdtype(s.dtype, np.floating):
+        return np.round(s.to_numpy(dtype='float64'), 5).tolist()
+
+    return s.to_numpy().tolist()
+
+
+def marker_rows(df, columns):
+    values = [_column_values(df[c]) for c in ['lat', 'long'] + list(columns)]
+
+    return [list(row) for row in zip(*values)]
+
+
+def cluster_map(df, popup):
+    # folium só é importado quando um mapa é montado (não em cache)
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    columns, popup_js = popup
+    density_map = folium.Map(location=[df['lat'].mean(), df['long'].mean()], default_zoom_start=15)
+
+    FastMarkerCluster(marker_rows(df, columns), callback=MARKER_CALLBACK % popup_js).add_to(density_map)
+
+    return density_map
+
+
+def grid_map(cells, zoom=spatial_bins.DEFAULT_ZOOM):
+    # uma única camada GeoJson com as células da grade; cor pela quantidade (log10)
+    import branca.colormap
+    import folium
+
+    center = [(cells['lat_min'].min() + cells['lat_max'].max()) / 2,
+              (cells['long_min'].min() + cells['long_max'].max()) / 2] if len(cells) else [47.5, -122.2]
+    density_map = folium.Map(location=center, zoom_start=zoom)
+    if not len(cells):
+        return density_map
+
+    colormap = branca.colormap.linear.YlOrRd_09.scale(0, max(np.log10(cells['count'].max()), 1))
+    colormap.caption = 'imóveis por célula (log10)'
+
+    folium.GeoJson(spatial_bins.geojson(cells),
+                   style_function=lambda f: {'fillColor': colormap(np.log10(f['properties']['count'])),
+                                             'fillOpacity': 0.6, 'weight': 0},
+                   tooltip=folium.GeoJsonTooltip(fields=['count', 'price', 'price_sqft'],
+                                                 aliases=['Imóveis', 'Preço médio', 'Preço/sqft médio'])
+                   ).add_to(density_map)
+    colormap.add_to(density_map)
+
+    return density_map
+
+
+@memo.by_version(pool=memo.VIEWS)
+def grid_map_html(data, version=None, zoom=spatial_bins.DEFAULT_ZOOM):
+    # mapa de densidade de todos os imóveis, em cache por versão e zoom
+    return map_html(grid_map(spatial_bins.grid(data, version, zoom), zoom))
+
+
+def map_html(density_map):
+    import folium
+
+    fig = folium.Figure().add_child(density_map)
+
+    return fig.render()
+
+
+@memo.by_version(pool=memo.VIEWS)
+def _cluster_map_html(df, key, popup):
+    return map_html(cluster_map(df, popup))
+
+
+def cluster_map_html(df, popup):
+    # html do mapa em cache pelo conjunto de imóveis exibido
+    return _cluster_map_html(df, frame_key(df, popup[0]), popup)
+
+
+def show(html, width=700, height=500):
+    return components.html(html, width=width, height=height + 10)
@@ -0,0 +1,109 @@
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Cache em memória por versão do dataset, compartilhado entre as sessões do
+# processo. Funções decoradas têm assinatura (data, version=None, ...) e
+# repassam version às dependências; sem version não há cache.
+# Cada função fica num de dois LRUs, limitados em entradas e em bytes (tamanho
+# aproximado dos resultados):
+#   DATA: agregados e tabelas (índice por zipcode, candidatos, sketch, cubos...),
+#         inclusive os gravados pelo warmup e pelos agregados do cache;
+#   VIEWS: resultados que variam com a interação (índices de ordenação por coluna,
+#          html de mapas, simulações por orçamento), que assim não tiram os de DATA.
+# SEATLE_HOUSES_MEMO_MB e SEATLE_HOUSES_VIEWS_MB mudam os limites em bytes.
+DATA = 'data'
+VIEWS = 'views'
+
+MAX_ENTRIES = {DATA: 128, VIEWS: 256}
+MAX_BYTES = {DATA: int(os.environ.get('SEATLE_HOUSES_MEMO_MB', 1024)) << 20,
+             VIEWS: int(os.environ.get('SEATLE_HOUSES_VIEWS_MB', 256)) << 20}
+
+_caches = {DATA: OrderedDict(), VIEWS: OrderedDict()}
+_sizes = {DATA: 0, VIEWS: 0}
+_lock = threading.Lock()
+
+
+def nbytes(value):
+    # tamanho aproximado de um resultado (arrays, frames, textos e coleções deles)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage())
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+
+    return sys.getsizeof(value)
+
+
+def _key(func, version, args, kwargs):
+    return (func.__module__, func.__qualname__, version, args, tuple(sorted(kwargs.items())))
+
+
+def _put(pool, key, value):
+    # grava e descarta os mais antigos além dos limites (fica ao menos a entrada nova)
+    cache = _caches[pool]
+    size = nbytes(value)
+    with _lock:
+        if key in cache:
+            _sizes[pool] -= cache.pop(key)[1]
+        cache[key] = (value, size)
+        _sizes[pool] += size
+        while len(cache) > 1 and (len(cache) > MAX_ENTRIES[pool] or _sizes[pool] > MAX_BYTES[pool]):
+            _, (_, old) = cache.popitem(last=False)
+            _sizes[pool] -= old
+
+
+def by_version(func=None, pool=DATA):
+    # @memo.by_version ou @memo.by_version(pool=memo.VIEWS)
+    if func is None:
+        return functools.partial(by_version, pool=pool)
+
+    @functools.wraps(func)
+    def wrapper(data, version=None, *args, **kwargs):
+        if version is None:
+            return func(data, None, *args, **kwargs)
+
+        key = _key(func, version, args, kwargs)
+        cache = _caches[pool]
+        with _lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key][0]
+
+        result = func(data, version, *args, **kwargs)
+        _put(pool, key, result)
+
+        return result
+
+    wrapper.pool = pool
+
+    return wrapper
+
+
+def store(func, version, value, *args, **kwargs):
+    # grava um resultado já calculado (ex.: atualização incremental) para a versão
+    _put(getattr(func, 'pool', DATA), _key(func, version, args, kwargs), value)
+
+
+def stats():
+    with _lock:
+        return {pool: {'entries': len(cache), 'bytes': _sizes[pool]} for pool, cache in _caches.items()}
+
+
+def clear(version=None):
+    with _lock:
+        for pool, cache in _caches.items():
+            for key in [k for k in cache if version is None or k[2] == version]:
+                _sizes[pool] -= cache.pop(key)[1]
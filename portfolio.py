@@ -0,0 +1,77 @@
+import numpy as np
+
+import memo
+import pricing
+
+
+def overview(sales):
+    # números gerais da tabela de venda
+    count = len(sales)
+
+    return {'count': count,
+            'avg_cost': float(sales['price'].mean()) if count else 0.0,
+            'avg_sale': float(sales['sales_price'].mean()) if count else 0.0,
+            'avg_profit': float(sales['profit'].mean()) if count else 0.0}
+
+
+def projection(sales, n):
+    # n imóveis "médios" comprados e vendidos
+    stats = overview(sales)
+    investment = n * stats['avg_cost']
+    ret = n * stats['avg_profit']
+
+    return {'houses': n,
+            'investment': investment,
+            'return': ret,
+            'percent_return': ret / investment * 100 if investment else 0.0}
+
+
+def select(sales, n=None, budget=None):
+    # posições dos imóveis escolhidos: maior percent_profit primeiro; com orçamento,
+    # imóveis que não cabem no saldo são pulados (guloso da mochila)
+    cost = sales['price'].to_numpy(dtype='float64')
+    order = np.argsort(-sales['percent_profit'].to_numpy(), kind='stable')
+    n = len(order) if n is None else min(n, len(order))
+
+    if budget is None:
+        return order[:n]
+
+    # enquanto o acumulado cabe no orçamento, a seleção é o próprio prefixo
+    spent = np.cumsum(cost[order])
+    k = min(n, int(np.searchsorted(spent, budget, side='right')))
+    chosen = list(order[:k])
+    left = budget - (spent[k - 1] if k else 0.0)
+
+    if k < n:
+        rest = order[k:]
+        rest_cost = cost[rest]
+        # menor custo restante a partir de cada posição, para parar cedo
+        min_after = np.minimum.accumulate(rest_cost[::-1])[::-1]
+        for i, (idx, c) in enumerate(zip(rest.tolist(), rest_cost.tolist())):
+            if len(chosen) >= n or min_after[i] > left:
+                break
+            if c <= left:
+                chosen.append(idx)
+                left -= c
+
+    return np.asarray(chosen, dtype=order.dtype)
+
+
+def summarize(sales, positions):
+    picked = sales.iloc[positions]
+    investment = float(picked['price'].sum())
+    ret = float(picked['profit'].sum())
+
+    return {'houses': len(picked),
+            'investment': investment,
+            'sales': float(picked['sales_price'].sum()),
+            'return': ret,
+            'percent_return': ret / investment * 100 if investment else 0.0}
+
+
+@memo.by_version(pool=memo.VIEWS)
+def simulate(data, version=None, n=None, budget=None):
+    # carteira escolhida a partir da tabela de venda, em cache por (versão, n, orçamento)
+    sales = pricing.sales_recommendations(data, version)
+
+    return summarize(sales, select(sales, n, budget))
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+import memo
+import pricing
+import zipcode_stats
+
+# Mediana aproximada por zipcode com um sketch de quantis de erro relativo: cada
+# preço cai no balde k = ceil(log_gamma(preço)), gamma = (1 + erro) / (1 - erro),
+# e o sketch guarda só a contagem de cada balde. Qualquer quantil estimado fica a
+# no máximo `erro` (relativo) do valor exato. Os sketches se juntam somando as
+# contagens e aceitam vendas novas e substituídas (soma e subtração), sem guardar
+# nem ordenar os preços; com erro de 1% são ~230 baldes (poucos KB) por zipcode.
+DEFAULT_ERROR = 0.01
+MIN_PRICE = 1.0
+
+
+def gamma(error):
+    return (1 + error) / (1 - error)
+
+
+def _keys(price, error):
+    price = np.maximum(np.asarray(price, dtype='float64'), MIN_PRICE)
+
+    return np.ceil(np.log(price) / np.log(gamma(error))).astype('int64')
+
+
+def _sketch(categories, codes, price, error):
+    keys = _keys(price, error)
+    codes = np.asarray(codes, dtype='int64')
+    offset = int(keys.min()) if len(keys) else 0
+    width = int(keys.max()) - offset + 1 if len(keys) else 1
+    n = len(categories)
+    counts = np.bincount(codes * width + (keys - offset), minlength=n * width).reshape(n, width)
+
+    return {'error': error, 'zipcodes': categories, 'offset': offset, 'counts': counts}
+
+
+def _align(sketch, categories, offset, width):
+    # contagens na ordem de categories e na faixa de baldes [offset, offset + width)
+    counts = np.zeros((len(categories), width), dtype='int64')
+    rows = categories.get_indexer(sketch['zipcodes'])
+    keep = rows >= 0
+    start = sketch['offset'] - offset
+    counts[rows[keep], start:start + sketch['counts'].shape[1]] = sketch['counts'][keep]
+
+    return counts
+
+
+def merge(a, b, categories=None):
+    # soma de dois sketches (mesmo erro); zipcodes na ordem de categories ou a união
+    if a['error'] != b['error']:
+        raise ValueError('sketches com erros diferentes: {} e {}'.format(a['error'], b['error']))
+    if categories is None:
+        categories = a['zipcodes'].union(b['zipcodes'])
+    offset = min(a['offset'], b['offset'])
+    width = max(a['offset'] + a['counts'].shape[1], b['offset'] + b['counts'].shape[1]) - offset
+
+    return {'error': a['error'],
+            'zipcodes': categories,
+            'offset': offset,
+            'counts': _align(a, categories, offset, width) + _align(b, categories, offset, width)}
+
+
+def _from_rows(rows, categories, error):
+    codes = categories.get_indexer(np.asarray(rows['zipcode']))
+
+    return _sketch(categories, codes, rows['price'], error)
+
+
+def update(sketch, data, added, removed):
+    # sketch do dataset novo: soma as vendas acrescentadas e subtrai as substituídas
+    _, categories = zipcode_stats.zipcode_codes(data)
+    error = sketch['error']
+    result = merge(sketch, _from_rows(added, categories, error), categories)
+    if len(removed):
+        gone = _from_rows(removed, categories, error)
+        gone['counts'] = -gone['counts']
+        result = merge(result, gone, categories)
+
+    return result
+
+
+@memo.by_version
+def build(data, version=None, error=DEFAULT_ERROR):
+    # sketch por zipcode na ordem das categorias (linha i = código i)
+    codes, categories = zipcode_stats.zipcode_codes(data)
+
+    return _sketch(categories, codes, data['price'], error)
+
+
+def store(version, sketch):
+    # sketch já calculado (ingestão, cache) no memo, na chave que as páginas usam
+    memo.store(build, version, sketch, sketch['error'])
+
+
+def to_frame(sketch):
+    # contagens não nulas em formato longo, para gravar junto do cache
+    rows, buckets = np.nonzero(sketch['counts'])
+
+    return pd.DataFrame({'zipcode': np.asarray(sketch['zipcodes'])[rows],
+                         'bucket': buckets + sketch['offset'],
+                         'count': sketch['counts'][rows, buckets],
+                         'error': np.full(len(rows), sketch['error'])})
+
+
+def from_frame(frame, data, error=DEFAULT_ERROR):
+    # sketch gravado, na ordem das categorias de data (None se não servir)
+    if not len(frame) or frame['error'].iloc[0] != error:
+        return None
+    _, categories = zipcode_stats.zipcode_codes(data)
+    rows = categories.get_indexer(frame['zipcode'].to_numpy())
+    if (rows < 0).any():
+        return None
+
+    bucket = frame['bucket'].to_numpy(dtype='int64')
+    offset = int(bucket.min())
+    counts = np.zeros((len(categories), int(bucket.max()) - offset + 1), dtype='int64')
+    counts[rows, bucket - offset] = frame['count'].to_numpy()
+
+    return {'error': error, 'zipcodes': categories, 'offset': offset, 'counts': counts}
+
+
+def quantile(sketch, q=0.5):
+    # estimativa por zipcode; entre dois postos faz a média, como a mediana exata
+    counts = sketch['counts']
+    n = counts.sum(axis=1)
+    cum = counts.cumsum(axis=1)
+    g = gamma(sketch['error'])
+
+    def value(rank):
+        bucket = (cum <= rank[:, None]).sum(axis=1)
+        # ponto do balde (g^(k-1), g^k] com erro relativo <= error nas duas pontas
+        return 2 * g ** (bucket + sketch['offset']) / (g + 1)
+
+    position = q * np.maximum(n - 1, 0)
+    result = (value(np.floor(position).astype('int64')) + value(np.ceil(position).astype('int64'))) / 2
+    result[n == 0] = np.nan
+
+    return result
+
+
+def nbytes(sketch):
+    # tamanho do estado por zipcode (contagens em int64)
+    return sketch['counts'].nbytes / max(len(sketch['zipcodes']), 1)
+
+
+@memo.by_version
+def purchase_candidates(data, version=None, error=DEFAULT_ERROR):
+    # mesmo critério de zipcode_stats.purchase_candidates, com a mediana do sketch
+    codes, _ = zipcode_stats.zipcode_codes(data)
+    median = quantile(build(data, version, error))
+
+    return zipcode_stats.select_candidates(data, median[codes])
+
+
+@memo.by_version
+def sales_recommendations(data, version=None, error=DEFAULT_ERROR):
+    return pricing.sales_table(purchase_candidates(data, version, error))
+
+
+def compare(data, version=None, error=DEFAULT_ERROR):
+    # quantos imóveis entram ou saem da recomendação de compra em relação à mediana exata
+    exact = zipcode_stats.purchase_candidates(data, version).index
+    approx = purchase_candidates(data, version, error).index
+
+    return {'error': error,
+            'exact': len(exact),
+            'sketch': len(approx),
+            'added': len(approx.difference(exact)),
+            'removed': len(exact.difference(approx)),
+            'bytes_per_zipcode': nbytes(build(data, version, error))}
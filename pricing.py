@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import memo
+import zipcode_stats
+
+# estação do ano por mês (índice 1..12)
+SEASONS = np.array([None,
+                    'winter', 'winter',
+                    'spring', 'spring', 'spring',
+                    'summer', 'summer', 'summer',
+                    'autumm', 'autumm', 'autumm',
+                    'winter'], dtype=object)
+
+# acréscimo sobre o preço de compra em cada estação
+HIGH_SEASON_MARKUP = 1.3
+LOW_SEASON_MARKUP = 1.1
+HIGH_SEASONS = ('spring', 'summer')
+
+
+def seasons(dates):
+    months = pd.DatetimeIndex(dates).month.to_numpy()
+
+    return SEASONS[months]
+
+
+def sales_price(price, season, median_price_region):
+    # preço de venda: preço + 30% (primavera/verão) ou + 10% (outono/inverno),
+    # nunca abaixo do preço mediano da região
+    price = np.asarray(price, dtype='float64')
+    high = np.isin(np.asarray(season, dtype=object), HIGH_SEASONS)
+    markup = np.where(high, HIGH_SEASON_MARKUP, LOW_SEASON_MARKUP)
+
+    return np.maximum(price * markup, np.asarray(median_price_region, dtype='float64'))
+
+
+def sales_table(df):
+    # recebe os imóveis recomendados para compra (com 'price', 'date' ou 'seasons'
+    # e 'median_price_region') e devolve a tabela de venda ordenada por lucro
+    price = df['price'].to_numpy(dtype='float64')
+    season = df['seasons'].to_numpy() if 'seasons' in df.columns else seasons(df['date'])
+
+    sale = sales_price(price, season, df['median_price_region'].to_numpy())
+    profit = sale - price
+    percent_profit = profit / price * 100
+
+    order = np.argsort(-percent_profit, kind='stable')
+
+    df = df.iloc[order].copy()
+    df['seasons'] = season[order]
+    df['sales_price'] = sale[order]
+    df['profit'] = profit[order]
+    df['percent_profit'] = percent_profit[order]
+
+    return df
+
+
+@memo.by_version
+def sales_recommendations(data, version=None):
+    # tabela de venda dos imóveis recomendados para compra
+    return sales_table(zipcode_stats.purchase_candidates(data, version))
@@ -1,27 +1,38 @@
 import pandas as pd
-import numpy as np
 import streamlit as st
-import plotly.express as px
-import folium
 
-from streamlit_folium import folium_static
-from folium.plugins import MarkerCluster
+import dataset
+import figure_cache
+import house_data
+import hypotheses
+import ingest
+import maps
+import portfolio
+import price_sketch
+import pricing
+import tables
+import timing
+import warmup
+import zipcode_stats
 
 st.set_page_config(
     page_title='Seatle Houses',
     layout='wide')
 
-@st.cache( allow_output_mutation=True)
-def get_data(path):
-    data = pd.read_csv(path)
-    data['date'] = pd.to_datetime(data['date']).dt.date
-    data = data.loc[data['bedrooms'] != 33].reset_index(drop=True)
-    data.drop(columns=['sqft_living15', 'sqft_lot15'], inplace=True)
-    data = data.drop_duplicates(subset=['id'], keep='last')
+@st.experimental_singleton
+def get_data(path, version=None):
+    # version entra só na chave do cache: vendas novas geram uma nova versão
+    # dados tratados (outlier, colunas e ids duplicados) vindos do cache colunar,
+    # num único dataset somente leitura por processo, compartilhado entre as sessões
+    frame = house_data.load_houses(path, clean=True)
+    # agregados gravados no cache (leitura em chunks, ingestão) entram no memo
+    ingest.seed_aggregates(path, version, frame)
+    data = dataset.Dataset(frame, version)
 
     return data
 
-def introduction(data):
+@timing.timed('introduction')
+def introduction(data, version=None):
 
     # Título
     st.markdown("<h1 style='text-align: center; color: darkgreen;'>Projeto - Seatle Houses</h1>",
@@ -49,7 +60,7 @@ def introduction(data):
 
     show_data = st.checkbox('Mostrar dados')
     if show_data:
-        st.dataframe(data, height=600)
+        tables.paginated(st, data, version, key='dados', height=600)
         st.write('Dimensão da tabela:',data.shape)
 
     # Mostrar legenda
@@ -86,7 +97,20 @@ def introduction(data):
 
     return None
 
-def rel_compra(data):
+def sketch_mode(data, version=None):
+    # mediana da região exata (todos os preços ordenados) ou aproximada (price_sketch);
+    # a opção fica na sessão e vale para os dois relatórios
+    sketch = st.sidebar.checkbox('Mediana aproximada (sketch)', key='sketch')
+    if sketch:
+        diff = price_sketch.compare(data, version)
+        st.caption(f'Mediana por sketch com erro de até {diff["error"]:.0%} ({diff["bytes_per_zipcode"]/1024:.1f} KB por região): '
+                   f'{diff["sketch"]} imóveis recomendados contra {diff["exact"]} com a mediana exata '
+                   f'({diff["added"]} entram, {diff["removed"]} saem).')
+
+    return sketch
+
+@timing.timed('rel_compra')
+def rel_compra(data, version=None):
     st.title('Relatório de Compra de imóveis')
     st.write('')
     st.write('Aqui mostraremos os melhores imóveis a serem comprados.')
@@ -98,35 +122,34 @@ def rel_compra(data):
                 '1. A condição da casa ser maior que 3;','\n',
                 '2. A casa estar com o preço menor ou igual a 90% do preço da mediana da região;')
 
-    df = data[['zipcode', 'price']].groupby('zipcode').median().reset_index()
-    df.columns = ['zipcode', 'median_price_region']
-
-    data = data.merge(df, how='inner')
-
-    df = data.loc[(data['price'] <= (data['median_price_region']*0.9)) & (data['condition'] >= 3)]
+    # imóveis recomendados (tabela compartilhada com o relatório de venda)
+    sketch = sketch_mode(data, version)
+    warmup.wait('purchase', version, st)
+    with timing.section('purchase candidates'):
+        if sketch:
+            df = price_sketch.purchase_candidates(data, version)
+        else:
+            df = zipcode_stats.purchase_candidates(data, version)
 
     # Mostrar tabela
     tabela = st.checkbox('Mostrar tabela')
     if tabela:
         st.write('dimensões da tabela:', f'{df.shape[0]} linhas e {df.shape[1]} colunas')
-        st.dataframe(df)
+        tables.paginated(st, df, tables.subversion(version, 'compra', 'sketch' if sketch else 'exact'), key='compra')
 
     # plotando imóveis no mapa
     st.header('Mostrando os imóveis no mapa')
     
     c1, c2 = st.columns((1,1))
 
-    density_map = folium.Map( location=[ df['lat'].mean(), df['long'].mean() ], default_zoom_start=15)
-    
-    marker_cluster = MarkerCluster().add_to( density_map )
-
-    for name, row in df.iterrows():
-        folium.Marker( [row['lat'], row['long']],popup='Sold $ {0:,.2f} on: {1}. Features: {2} sqft, {3} bedrooms, {4} bathrooms, year built: {5}'.format(
-                        row['price'], row['date'], row['sqft_living'],row['bedrooms'],
-                        row['bathrooms'],row['yr_built'])).add_to(marker_cluster)
+    # marcadores criados no navegador; html em cache pelo conjunto exibido
+    warmup.wait('purchase map', version, st)
+    with timing.section('purchase map html') as info:
+        map_html = maps.cluster_map_html(df, maps.PURCHASE_POPUP)
+        info['bytes'] = len(map_html)
 
     with c1:
-        folium_static( density_map )
+        maps.show( map_html )
 
     with c2:
         st.subheader('Informações sobre os imóveis:')
@@ -143,30 +166,24 @@ def rel_compra(data):
 
     return None
 
-def rel_venda(data):
+@timing.timed('rel_venda')
+def rel_venda(data, version=None):
+    # plotly só carrega nas páginas com gráfico (Introdução e Conclusão não precisam)
+    import plotly.express as px
+
     st.title('Relatório de Venda de imóveis')
     st.write('')
     st.write('Aqui mostraremos os melhores imóveis a serem vendidos.')
     st.write('Primeiro verificaremos se a época do ano inflencia no preço dos imóveis.')
-    data['seasons'] = pd.to_datetime(data['date']).dt.month
-    data['seasons'] = data['seasons'].map({1: 'winter',
-                                           2: 'winter',
-                                           3: 'spring',
-                                           4: 'spring',
-                                           5: 'spring',
-                                           6: 'summer',
-                                           7: 'summer',
-                                           8: 'summer',
-                                           9: 'autumm',
-                                           10: 'autumm',
-                                           11: 'autumm',
-                                           12: 'winter'})
-    grouped = data[['price', 'seasons']].groupby(by='seasons').mean().reset_index()
+    grouped = data[['price']].assign(seasons=pricing.seasons(data['date']))
+    grouped = grouped.groupby(by='seasons').mean().reset_index()
     media_preco_inverno = float(grouped.loc[grouped['seasons'] == 'winter', 'price'])
     media_preco_primavera = float(grouped.loc[grouped['seasons'] == 'spring', 'price'])
     c1, c2 = st.columns((1,1))
-    fig = px.line(grouped, x='seasons', y='price', title="Média de preços por estações")
-    c1.plotly_chart(fig, use_container_width=True)
+    with timing.section('seasons figure'):
+        fig = figure_cache.figure(version, 'seasons', (),
+                                  lambda: px.line(grouped, x='seasons', y='price', title="Média de preços por estações"))
+    figure_cache.show(c1, fig, 'seasons')
     c2.subheader('observações:')
     c2.write(f':pushpin:Podemos ver que a primavera e o verão são as melhores épocas para venda de imóveis;')
     c2.write(f':pushpin:Podemos ver que o inverno é a pior época para venda de imóveis;')
@@ -179,47 +196,34 @@ def rel_venda(data):
     st.write(':memo: Já para o inverno e outono acresceremos o valor do imóvel em apenas 10%.')
     st.write(':memo: Caso o cálculo acima fique menor que o preço mediano da região, o valor de venda será o preço mediano da região.')
 
-    df = data[['zipcode', 'price']].groupby('zipcode').median().reset_index()
-    df.columns = ['zipcode', 'median_price_region']
-
-    data = data.merge(df, how='inner')
-
-    df = data.loc[(data['price'] <= (data['median_price_region']*0.9)) & (data['condition'] >= 3)]
-
-
-    df['sales_price'] = df[['price', 'seasons']].apply(lambda x: x['price'] * 1.3 if x['seasons'] =='spring'
-                                                        else x['price'] * 1.3 if x['seasons'] =='summer'
-                                                        else x['price']*1.1    
-                                                        ,axis=1)
-    df['sales_price'] = df[['sales_price', 'median_price_region']].apply(lambda x: x['sales_price'] 
-                                                        if x['sales_price'] >= x['median_price_region']
-                                                        else x['median_price_region'], axis=1)
-    df['profit'] = df['sales_price'] - df['price']
-    df['percent_profit'] = df['profit']/df['price']*100
-    df = df.sort_values(by=['percent_profit'], ascending=False)
+    # preço de venda, lucro e % de lucro calculados por coluna (ordenado por % de lucro)
+    sketch = sketch_mode(data, version)
+    warmup.wait('sales', version, st)
+    with timing.section('sales recommendations'):
+        if sketch:
+            df = price_sketch.sales_recommendations(data, version)
+        else:
+            df = pricing.sales_recommendations(data, version)
 
     # Mostrar tabela
     tabela = st.checkbox('Mostrar tabela')
     if tabela:
         st.write('dimensões da tabela:', f'{df.shape[0]} linhas e {df.shape[1]} colunas')
-        st.dataframe(df)
+        tables.paginated(st, df, tables.subversion(version, 'venda', 'sketch' if sketch else 'exact'), key='venda')
 
     # plotando imóveis no mapa
     st.header('Mostrando os imóveis no mapa')
     
     c1, c2 = st.columns((1,1))
 
-    density_map = folium.Map( location=[ df['lat'].mean(), df['long'].mean() ], default_zoom_start=15)
-    
-    marker_cluster = MarkerCluster().add_to( density_map )
-
-    for name, row in df.iterrows():
-        folium.Marker( [row['lat'], row['long']],popup='Sales price $ {0:,.2f}, and profit {1:,.2f}. Features: {2} sqft, {3} bedrooms, {4} bathrooms, year built: {5}'.format(
-                        row['sales_price'], row['profit'], row['sqft_living'],row['bedrooms'],
-                        row['bathrooms'],row['yr_built'])).add_to(marker_cluster)
+    # marcadores criados no navegador; html em cache pelo conjunto exibido
+    warmup.wait('sales map', version, st)
+    with timing.section('sales map html') as info:
+        map_html = maps.cluster_map_html(df, maps.SALES_POPUP)
+        info['bytes'] = len(map_html)
 
     with c1:
-        folium_static( density_map )
+        maps.show( map_html )
 
     with c2:
         st.subheader('Informações sobre os imóveis:')
@@ -234,19 +238,28 @@ def rel_venda(data):
 
     return None
 
-def insights(data):
+@timing.timed('insights')
+def insights(data, version=None):
+    import plotly.express as px
+
     st.title('Insights')
     st.write('')
     st.write('Aqui mostraremos alguns insigths que tivemos ao analisar o Dataset.')
 
+    # médias de todas as hipóteses calculadas de uma vez (sem alterar o dataset)
+    warmup.wait('insights', version, st)
+    summary = hypotheses.summary(data, version)
+
     c1, c2 = st.columns((1,1))
 
     with c1:
         st.subheader('Hipótese 1: Imóveis com vista para água são em média mais caros')
 
-        df = data[['price', 'waterfront']].groupby('waterfront').mean().reset_index()
-        fig = px.bar(df, x='waterfront', y='price', title='Média de preços por tipo de vista')
-        st.plotly_chart(fig, use_container_width=True)
+        df = hypotheses.group_means(summary, 'waterfront')
+        with timing.section('waterfront figure'):
+            fig = figure_cache.figure(version, 'hypothesis waterfront', (),
+                                      lambda: px.bar(df, x='waterfront', y='price', title='Média de preços por tipo de vista'))
+        figure_cache.show(st, fig, 'waterfront')
 
     with c2:
         st.subheader('Conclusões Hipótese 1:')
@@ -263,10 +276,11 @@ def insights(data):
     with c1:
         st.subheader('Hipótese 2: Imóveis com porão são em média mais caros')
 
-        data['basement'] = data['sqft_basement'].apply(lambda x: 0 if x == 0 else 1)
-        df = data[['price', 'basement']].groupby('basement').mean().reset_index()
-        fig = px.bar(df, x='basement', y='price', title='Média de preços de imóveis sem porão e com porão')
-        st.plotly_chart(fig, use_container_width=True)
+        df = hypotheses.group_means(summary, 'basement')
+        with timing.section('basement figure'):
+            fig = figure_cache.figure(version, 'hypothesis basement', (),
+                                      lambda: px.bar(df, x='basement', y='price', title='Média de preços de imóveis sem porão e com porão'))
+        figure_cache.show(st, fig, 'basement')
 
     with c2:
         st.subheader('Conclusões Hipótese 2:')
@@ -283,10 +297,11 @@ def insights(data):
     with c1:
         st.subheader('Hipótese 3: Imóveis térreos são em média mais baratos')
 
-        data['ground'] = data['floors'].apply(lambda x: 1 if x <= 1 else 0)
-        df = data[['price', 'ground']].groupby('ground').mean().reset_index()
-        fig = px.bar(df, x='ground', y='price', title='Média de preços de imóveis térreos')
-        st.plotly_chart(fig, use_container_width=True)
+        df = hypotheses.group_means(summary, 'ground')
+        with timing.section('ground figure'):
+            fig = figure_cache.figure(version, 'hypothesis ground', (),
+                                      lambda: px.bar(df, x='ground', y='price', title='Média de preços de imóveis térreos'))
+        figure_cache.show(st, fig, 'ground')
 
     with c2:
         st.subheader('Conclusões Hipótese 3:')
@@ -303,10 +318,11 @@ def insights(data):
     with c1:
         st.subheader('Hipótese 4: Imóveis com até 2 quartos são em média mais baratos')
 
-        data['twobedrooms'] = data['bedrooms'].apply(lambda x: 1 if x <= 2 else 0)
-        df = data[['price', 'twobedrooms']].groupby('twobedrooms').mean().reset_index()
-        fig = px.bar(df, x='twobedrooms', y='price', title='Média de preços de imóveis com até dois quartos')
-        st.plotly_chart(fig, use_container_width=True)
+        df = hypotheses.group_means(summary, 'twobedrooms')
+        with timing.section('twobedrooms figure'):
+            fig = figure_cache.figure(version, 'hypothesis twobedrooms', (),
+                                      lambda: px.bar(df, x='twobedrooms', y='price', title='Média de preços de imóveis com até dois quartos'))
+        figure_cache.show(st, fig, 'twobedrooms')
 
     with c2:
         st.subheader('Conclusões Hipótese 4:')
@@ -323,10 +339,11 @@ def insights(data):
     with c1:
         st.subheader('Hipótese 5: Imóveis com até 1 banheiro são em média mais baratos')
 
-        data['onebath'] = data['bathrooms'].apply(lambda x: 1 if x <= 1 else 0)
-        df = data[['price', 'onebath']].groupby('onebath').mean().reset_index()
-        fig = px.bar(df, x='onebath', y='price', title='Média de preços de imóveis com até 1 banheiro')
-        st.plotly_chart(fig, use_container_width=True)
+        df = hypotheses.group_means(summary, 'onebath')
+        with timing.section('onebath figure'):
+            fig = figure_cache.figure(version, 'hypothesis onebath', (),
+                                      lambda: px.bar(df, x='onebath', y='price', title='Média de preços de imóveis com até 1 banheiro'))
+        figure_cache.show(st, fig, 'onebath')
 
     with c2:
         st.subheader('Conclusões Hipótese 5:')
@@ -339,17 +356,44 @@ def insights(data):
         st.write(f':pushpin: Isto representa uma diminuição de {(1-b/a):.0%} para imóveis com até 1 banheiro.')
     return None
 
-def conclusion(data):
+def br_number(value, decimals=0):
+    # 7568.5 -> '7.568,50'
+    s = f'{value:,.{decimals}f}'
+
+    return s.replace(',', '_').replace('.', ',').replace('_', '.')
+
+@timing.timed('conclusion')
+def conclusion(data, version=None):
     st.title('Conclusão')
     st.write('')
-    st.write('Após analisarmos os relatórios apresentados, foram identificados cerca de 7.568 imóveis\
-         com potencial de compra, a um custo médio de cerca de 368 mil dólares.')
-    st.write('Com relação as vendas destes imóveis, identificamos que podem ser vendidos a um preço\
-         médio de 509 mil dólares.')
-    st.write('Caso a equipe consiga comprar e vender cerca de 100 imóveis durante um ano,\
+
+    # números calculados a partir da tabela de venda atual
+    warmup.wait('sales', version, st)
+    sales = pricing.sales_recommendations(data, version)
+    stats = portfolio.overview(sales)
+    proj = portfolio.projection(sales, 100)
+
+    st.write(f'Após analisarmos os relatórios apresentados, foram identificados cerca de {br_number(stats["count"])} imóveis\
+         com potencial de compra, a um custo médio de cerca de {br_number(stats["avg_cost"]/1e3)} mil dólares.')
+    st.write(f'Com relação as vendas destes imóveis, identificamos que podem ser vendidos a um preço\
+         médio de {br_number(stats["avg_sale"]/1e3)} mil dólares.')
+    st.write(f'Caso a equipe consiga comprar e vender cerca de {proj["houses"]} imóveis durante um ano,\
          estimamos que será necessário:')
-    st.write(':pushpin: Um investimento de cerca de 51 milhões de dólares;')
-    st.write(':pushpin: Teremos um retorno esperado de cerca de 14 milhões de dólares, ou seja, 27,45% sobre o valor investido;')
+    st.write(f':pushpin: Um investimento de cerca de {br_number(proj["investment"]/1e6)} milhões de dólares;')
+    st.write(f':pushpin: Teremos um retorno esperado de cerca de {br_number(proj["return"]/1e6)} milhões de dólares, \
+        ou seja, {br_number(proj["percent_return"], 2)}% sobre o valor investido;')
+
+    # simulação de carteira: melhores imóveis por % de lucro dentro do orçamento
+    st.header('Simulação de carteira')
+    c1, c2 = st.columns((1,1))
+    n = c1.number_input('Quantidade máxima de imóveis', min_value=1, value=100, step=10)
+    budget = c2.number_input('Orçamento (USD)', min_value=0, value=50_000_000, step=1_000_000)
+
+    sim = portfolio.simulate(data, version, n=int(n), budget=float(budget))
+    st.write(f':pushpin: Imóveis selecionados: {sim["houses"]}')
+    st.write(f':pushpin: Investimento: USD {sim["investment"]:,.2f}')
+    st.write(f':pushpin: Valor de venda: USD {sim["sales"]:,.2f}')
+    st.write(f':pushpin: Lucro esperado: USD {sim["return"]:,.2f} ({sim["percent_return"]:.2f}%)')
 
     return None
 
@@ -363,19 +407,34 @@ if __name__ == '__main__':
     page = st.sidebar.selectbox("Selecione uma página", 
                         ['Introdução', 'Relatório - Compra', 'Relatório - Venda', 'Insights', 'Conclusão'])
     
+    timing.start(page)
+
     # carregar dados
     path = 'kc_house_data.csv'
-    data = get_data(path)
+    with timing.section('load'):
+        version = house_data.dataset_version(path)
+        # nova versão: o dataset anterior sai do singleton
+        if dataset.replaces('project', version):
+            get_data.clear()
+        data = get_data(path, version).view()
+
+    # todas as páginas são pré-calculadas em segundo plano (warmup), uma vez por
+    # versão; cada página só espera pelo que ainda não terminou
+    warmup.start(data, version, path)
+    warmup.panel(st, version)
 
     if page == 'Introdução':
-        introduction(data)
+        introduction(data, version)
     elif page == 'Relatório - Compra':
-        rel_compra(data)
+        rel_compra(data, version)
     elif page == 'Relatório - Venda':
-        rel_venda(data)
+        rel_venda(data, version)
     elif page == 'Insights':
-        insights(data)
+        insights(data, version)
     elif page == 'Conclusão':
-        conclusion(data)
+        conclusion(data, version)
     else:
-        introduction(data)
+        introduction(data, version)
+
+    # painel de tempos na barra lateral e exportação (SEATLE_HOUSES_TIMINGS)
+    timing.finish(st)
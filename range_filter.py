@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+import memo
+
+# Filtros "até X" dos sliders e selectboxes do dashboard. Para cada coluna filtrável
+# guarda, uma vez por versão do dataset, os valores distintos ordenados com contagem
+# e soma por valor e os acumulados. Cada movimento do slider vira uma busca binária
+# nesses arrays, sem percorrer as linhas.
+
+
+@memo.by_version
+def column_index(data, version=None, column='price', value=None):
+    keys, inverse = np.unique(data[column].to_numpy(), return_inverse=True)
+    count = np.bincount(inverse, minlength=len(keys))
+
+    index = {'column': column,
+             'keys': keys,
+             'count': count,
+             'cum_count': np.concatenate(([0], np.cumsum(count)))}
+
+    if value is not None:
+        total = np.bincount(inverse, weights=data[value].to_numpy(dtype='float64'), minlength=len(keys))
+        index['value'] = value
+        index['sum'] = total
+        index['cum_sum'] = np.concatenate(([0.0], np.cumsum(total)))
+
+    return index
+
+
+def upto(index, limit):
+    # quantidade de valores distintos <= limit
+    return int(np.searchsorted(index['keys'], limit, side='right'))
+
+
+def bounds(index):
+    keys = index['keys']
+
+    return keys[0], keys[-1]
+
+
+def mean(index, limit=None):
+    # média de value nas linhas com coluna <= limit (todas, sem limite)
+    k = len(index['keys']) if limit is None else upto(index, limit)
+    n = index['cum_count'][k]
+
+    return index['cum_sum'][k] / n if n else np.nan
+
+
+def group_means(index, limit=None):
+    # média de value por valor distinto da coluna, até limit
+    k = len(index['keys']) if limit is None else upto(index, limit)
+
+    return pd.DataFrame({index['column']: index['keys'][:k],
+                         index['value']: index['sum'][:k] / index['count'][:k]})
+
+
+def value_counts(index, limit=None):
+    # contagem por valor distinto, até limit
+    k = len(index['keys']) if limit is None else upto(index, limit)
+
+    return pd.DataFrame({index['column']: index['keys'][:k], 'count': index['count'][:k]})
+
+
+def histogram(index, limit=None, bins=50):
+    # histograma de bins iguais entre o menor valor e limit, pelas contagens acumuladas
+    low, high = bounds(index)
+    high = high if limit is None else min(limit, high)
+    if high < low:
+        return pd.DataFrame({index['column']: [], 'count': []})
+
+    edges = np.linspace(low, high, bins + 1)
+    pos = np.searchsorted(index['keys'], edges, side='left')
+    # o último bin é fechado à direita
+    pos[-1] = upto(index, high)
+    count = np.diff(index['cum_count'][pos])
+
+    return pd.DataFrame({index['column']: (edges[:-1] + edges[1:]) / 2, 'count': count})
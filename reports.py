@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import sys
+
+import house_data
+import portfolio
+import zipcode_pool
+
+# Relatórios de compra e venda em arquivo, sem streamlit/plotly/folium:
+#   python reports.py kc_house_data.csv --output reports --workers 4
+# Gera compra.parquet, venda.parquet (ou .csv com --format csv) e metricas.json.
+# Os grupos de zipcodes são processados em paralelo pelo zipcode_pool.
+OUTPUT_DIR = 'reports'
+FORMATS = ('parquet', 'csv')
+
+
+def build(path, clean=True, workers=None):
+    data = house_data.load_houses(path, clean=clean)
+    result = zipcode_pool.build(data, None, path, clean, workers or zipcode_pool.WORKERS,
+                                names=('purchase', 'sales', 'seasons'))
+
+    return result['purchase'], result['sales'], result['seasons']
+
+
+def metrics(purchase, sales, season, version=None):
+    count = len(purchase)
+    avg_cost = float(purchase['price'].mean()) if count else 0.0
+    avg_region = float(purchase['median_price_region'].mean()) if count else 0.0
+    season_price = (season['sum'] / season['count']).to_dict()
+
+    return {'version': version,
+            'purchase': {'count': count,
+                         'avg_cost': avg_cost,
+                         'avg_median_price_region': avg_region,
+                         'avg_gross_gain': avg_region - avg_cost},
+            'sales': portfolio.overview(sales),
+            'season_avg_price': {k: float(v) for k, v in season_price.items()}}
+
+
+def write_table(df, path, fmt):
+    if fmt == 'parquet':
+        df.to_parquet(path + '.parquet', index=False)
+    else:
+        df.to_csv(path + '.csv', index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Relatórios de compra e venda do Seatle Houses')
+    parser.add_argument('path', nargs='?', default='kc_house_data.csv')
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--format', choices=FORMATS, default='parquet')
+    parser.add_argument('--workers', type=int, help='processos (padrão: SEATLE_HOUSES_WORKERS ou número de CPUs)')
+    args = parser.parse_args(argv)
+
+    version = house_data.dataset_version(args.path)
+    purchase, sales, season = build(args.path, workers=args.workers)
+
+    os.makedirs(args.output, exist_ok=True)
+    write_table(purchase, os.path.join(args.output, 'compra'), args.format)
+    write_table(sales, os.path.join(args.output, 'venda'), args.format)
+    with open(os.path.join(args.output, 'metricas.json'), 'w') as f:
+        json.dump(metrics(purchase, sales, season, version), f, indent=1)
+
+    print('{} imóveis para compra, {} para venda, gravados em {}'.format(len(purchase), len(sales), args.output))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
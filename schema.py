@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+# Esquema do registro de venda do King County: tipo mínimo de cada coluna e faixa
+# de valores aceitos. Todas as entradas leem os dados pelo house_data, que aplica
+# o esquema ao csv, aos chunks e às vendas novas. Os valores são conferidos antes
+# da conversão: um valor que não cabe no tipo levanta SchemaError em vez de virar
+# outro número. A faixa de valores vale para os dados tratados; os dados brutos
+# (dashboard) mantêm os outliers que a limpeza remove, como o imóvel de 33 quartos.
+# Áreas em uint32: um imóvel acima de 65.535 sqft é válido. VERSION vai para o
+# manifest do cache: mudar um tipo aqui remonta os caches gravados com o anterior.
+VERSION = 2
+
+
+class SchemaError(ValueError):
+    pass
+
+
+# coluna -> (tipo, mínimo, máximo); None: sem limite além do próprio tipo
+COLUMNS = {
+    'id': ('int64', 1, None),
+    'date': ('datetime64[ns]', None, None),
+    'price': ('int32', 1, None),
+    'bedrooms': ('uint8', 0, 15),
+    'bathrooms': ('float32', 0, 10),
+    'sqft_living': ('uint32', 1, None),
+    'sqft_lot': ('uint32', 1, None),
+    'floors': ('float32', 1, 4),
+    'waterfront': ('uint8', 0, 1),
+    'view': ('uint8', 0, 4),
+    'condition': ('uint8', 1, 5),
+    'grade': ('uint8', 1, 13),
+    'sqft_above': ('uint32', 0, None),
+    'sqft_basement': ('uint32', 0, None),
+    'yr_built': ('uint16', 1800, 2100),
+    'yr_renovated': ('uint16', 0, 2100),
+    'zipcode': ('category', 98000, 98299),
+    'lat': ('float32', 47.0, 48.0),
+    'long': ('float32', -123.0, -121.0),
+    'sqft_living15': ('uint32', 0, None),
+    'sqft_lot15': ('uint32', 0, None),
+}
+
+
+def _values(s):
+    # valores numéricos da coluna (categóricas: as categorias)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return np.asarray(s.cat.categories)
+
+    return s.to_numpy()
+
+
+def _limits(dtype, low, high, ranges):
+    # faixa do tipo, restringida pela do esquema nos dados tratados
+    if dtype != 'category' and np.issubdtype(np.dtype(dtype), np.integer):
+        info = np.iinfo(dtype)
+        type_low, type_high = info.min, info.max
+    else:
+        type_low, type_high = None, None
+
+    if not ranges:
+        return type_low, type_high
+
+    return (low if low is not None else type_low), (high if high is not None else type_high)
+
+
+def problems(data, ranges=True):
+    # lista de mensagens, uma por coluna com valores inválidos
+    found = []
+    for col, (dtype, low, high) in COLUMNS.items():
+        if col not in data.columns or dtype.startswith('datetime'):
+            continue
+
+        values = _values(data[col])
+        if not np.issubdtype(values.dtype, np.number):
+            values = pd.to_numeric(values, errors='coerce')
+        values = np.asarray(values, dtype='float64')
+
+        missing = np.isnan(values)
+        if missing.any() and dtype != 'float32':
+            found.append('{}: {} valor(es) ausente(s) ou não numérico(s)'.format(col, int(missing.sum())))
+
+        low, high = _limits(dtype, low, high, ranges)
+        bad = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        if bad.any():
+            found.append('{}: {} valor(es) fora de [{}, {}] (ex.: {:g})'.format(
+                col, int(bad.sum()), low, high, values[bad][0]))
+
+    return found
+
+
+def validate(data, ranges=True):
+    found = problems(data, ranges)
+    if found:
+        raise SchemaError('dados fora do esquema:\n  ' + '\n  '.join(found))
+
+    return data
+
+
+def apply(data, ranges=True):
+    # confere e converte as colunas do esquema (as demais ficam como estão)
+    validate(data, ranges)
+
+    data = data.copy()
+    for col, (dtype, _, _) in COLUMNS.items():
+        if col not in data.columns:
+            continue
+        if dtype.startswith('datetime'):
+            data[col] = pd.to_datetime(data[col])
+        elif dtype == 'category':
+            data[col] = data[col].astype('int64').astype('category')
+        else:
+            data[col] = data[col].astype(dtype)
+
+    return data
@@ -1,42 +1,46 @@
-from operator import ge
-from re import T
-import pandas as pd
-import numpy as np
-import plotly.express as px
 import streamlit as st
-import folium
-import geopandas
-from datetime import datetime
-
-from streamlit_folium import folium_static
-from folium.plugins import MarkerCluster
-
+import dataset
+import figure_cache
+import geo_store
+import house_data
+import range_filter
+import maps
+import summary_cube
+import tables
+import time_series
+import timing
+
+# plotly, folium e geopandas são importados só nas seções que os usam:
+# a tabela de overview aparece antes de qualquer biblioteca de gráfico/mapa carregar
 st.set_page_config(layout='wide')
 
+# tempos por seção: painel na barra lateral e SEATLE_HOUSES_TIMINGS (json lines)
+timing.start('seatle_houses_app')
+
 # Read data
-@st.cache( allow_output_mutation=True)
-def get_data(path):
-    data = pd.read_csv(path)
-    data['date'] = pd.to_datetime(data['date'])
+@st.experimental_singleton
+def get_data(path, version=None):
+    # version entra só na chave do cache: vendas novas geram uma nova versão
+    # um único dataset somente leitura por processo, compartilhado entre as sessões
+    data = dataset.Dataset(house_data.load_houses(path, clean=False), version)
 
     return data
 
-@st.cache( allow_output_mutation=True )
-def get_geofile( url ):
-    geofile = geopandas.read_file( url )
+def get_geofile( data, version=None ):
+    # geometrias locais (geo_store), já filtradas pelos zipcodes dos dados
+    geofile = geo_store.region_geojson( data, version )
 
     return geofile
 
 # load data
 path = 'kc_house_data.csv'
-data = get_data(path)
-
-# get goefile
-url = 'https://opendata.arcgis.com/datasets/83fc2e72903343aabff6de8cb445b81c_2.geojson'
-geofile = get_geofile( url )
-
-# add new features
-data['price_sqft'] = data['price'] / data['sqft_lot']
+version = house_data.dataset_version(path, clean=False)
+# nova versão: o dataset anterior sai do singleton
+if dataset.replaces('seatle_houses_app', version):
+    get_data.clear()
+# add new features: visão do dataset com price_sqft (calculada uma vez)
+data = get_data(path, version).view('price_sqft')
+timing.lap('load')
 
 st.title('Seatle Houses Overview')
 
@@ -44,112 +48,102 @@ st.title('Seatle Houses Overview')
 f_attributes = st.sidebar.multiselect( 'Enter Columns', data.columns)
 f_zipcode = st.sidebar.multiselect('Enter Zipcode', data['zipcode'].unique())
 
-if (f_attributes != []) & (f_zipcode != []):
-    data = data.loc[ data['zipcode'].isin(f_zipcode), f_attributes ]
+# médias e estatísticas saem do cubo por zipcode, sem varrer os dados a cada filtro
+cube = summary_cube.build_cube( data, version )
+stats = summary_cube.describe( cube, data, f_zipcode, f_attributes )
 
-elif (f_attributes == []) & (f_zipcode != []):
-    data = data.loc[ data['zipcode'].isin(f_zipcode), : ]
+if f_zipcode != []:
+    data = data.iloc[ summary_cube.rows( cube, f_zipcode ) ]
+    # os índices dos filtros abaixo são do recorte de zipcodes, não do dataset todo
+    version = '{}|{}'.format( version, ','.join(sorted(map(str, f_zipcode))) )
 
-elif (f_attributes != []) & (f_zipcode == []):
+if f_attributes != []:
     data = data.loc[ :, f_attributes ]
 
-else:
-    data = data.copy()
-
 
-st.dataframe(data, height=300)
+# só a página visível vai para o navegador; ordenação pelos índices da versão
+tables.paginated( st, data, version, key='overview', height=300 )
 
 c1, c2 = st.columns((1,1))
 # Average Metrics
-df1 = data[['id','zipcode']].groupby('zipcode').count().reset_index()
-df2 = data[['price','zipcode']].groupby('zipcode').mean().reset_index()
-df3 = data[['sqft_living','zipcode']].groupby('zipcode').mean().reset_index()
-df4 = data[['price_sqft','zipcode']].groupby('zipcode').mean().reset_index()
-
-# merge
-n1 = pd.merge( df1, df2, on='zipcode', how='inner' )
-n2 = pd.merge( n1, df3, on='zipcode', how='inner' )
-df = pd.merge( n2, df4, on='zipcode', how='inner' )
-df.columns = ['ZIPCODE', 'TOTAL HOUSES', 'PRICE', 'SQFT LIVING','PRICE/SQFT']
-
+df = summary_cube.averages( cube, f_zipcode )
 
 c1.header('Average Values')
 c1.dataframe(df, height=300)
 
 # Statistic Descriptive
-df1 = data.describe().T.reset_index()
-df1.drop(columns=['count', '25%', '75%'], inplace=True)
-df1.columns = ['ATTRIBUTES','MEAN', 'STD', 'MIN', 'MEDIAN', 'MAX']
-df1 = df1[['ATTRIBUTES', 'MAX', 'MIN', 'MEAN', 'MEDIAN', 'STD']]
-
 c2.header('Statistic Descriptive')
-c2.dataframe(df1, height=300)
+c2.dataframe(stats, height=300)
+timing.lap('overview')
 
 # Portifolio density map
+import folium
+
 st.title('Region Overview')
 
 c1, c2 = st.columns((1,1))
 c1.header('Portifolio Density')
 
-# df = data.copy()
-df = data.sample(10)
-
-#Base map - Folium
-density_map = folium.Map( location=[ data['lat'].mean(), data['long'].mean() ],
-            default_zoom_start=15
-)
-
-marker_cluster = MarkerCluster().add_to( density_map )
-
-for name, row in df.iterrows():
-    folium.Marker( [row['lat'], row['long']],
-                    popup='Sold R$ {0} on: {1}. Features: {2} sqft, {3} bedrooms, {4} bathrooms, year built: {5}'.format(
-                        row['price'], row['date'], row['sqft_living'],row['bedrooms'],
-                        row['bathrooms'],row['yr_built'])).add_to(marker_cluster)
+# todos os imóveis agregados numa grade (spatial_bins), numa única camada;
+# html em cache por versão (a do recorte de zipcodes, se houver)
+with timing.section('density map html') as info:
+    html = maps.grid_map_html( data, version )
+    info['bytes'] = len(html)
 
 with c1:
-    folium_static( density_map )
-
-region_price_map = folium.Map( location=[ data['lat'].mean(), data['long'].mean() ],
-            default_zoom_start=15
-)
+    maps.show( html )
+timing.lap('density map show')
 
 # Region Price Map
 c2.header('Price Density')
 
-df = data[['price','zipcode']].groupby('zipcode').mean().reset_index()
-df.columns = ['ZIP', 'PRICE']
-
-geofile = geofile[ geofile['ZIP'].isin( df['ZIP'].tolist())]
-
-region_price_map = folium.Map( location= [ data['lat'].mean(), data['long'].mean()], 
-                                default_zoom_start=15 )
-
-region_price_map.choropleth( data=df,
-                            geo_data= geofile,
-                            columns=['ZIP', 'PRICE'],
-                            key_on='feature.properties.ZIP',
-                            fill_color='YlOrRd',
-                            fill_opacity = 0.7,
-                            line_opacity = 0.2,
-                            legend_name='AVG PRICE')
-
-
-with c2:
-    folium_static( region_price_map )
+# get goefile (só dos zipcodes exibidos); sem a base local (geo_store) o mapa
+# de preço por região não aparece
+try:
+    geofile = get_geofile( data, version )
+except geo_store.GeoStoreMissing as error:
+    geofile = None
+    c2.warning( str(error) )
+timing.lap('geofile')
+
+if geofile is not None:
+    df = data[['price','zipcode']].groupby('zipcode', observed=True).mean().reset_index()
+    df.columns = ['ZIP', 'PRICE']
+
+    region_price_map = folium.Map( location= [ data['lat'].mean(), data['long'].mean()], 
+                                    default_zoom_start=15 )
+
+    region_price_map.choropleth( data=df,
+                                geo_data= geofile,
+                                columns=['ZIP', 'PRICE'],
+                                key_on='feature.properties.ZIP',
+                                fill_color='YlOrRd',
+                                fill_opacity = 0.7,
+                                line_opacity = 0.2,
+                                legend_name='AVG PRICE')
+    timing.lap('price map')
+
+    with timing.section('price map html') as info:
+        html = maps.map_html( region_price_map )
+        info['bytes'] = len(html)
+
+    with c2:
+        maps.show( html )
+timing.lap('price map show')
 
 # Distribuíção de imóveis por categorias comerciais
+import plotly.express as px
+
 
 st.sidebar.title('Commercial Options')
 st.title('Commercial Attributes')
 
 # average price per year
-
-data['date'] = pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d')
+# os filtros consultam os índices por coluna (range_filter), sem varrer os dados
+year_index = range_filter.column_index( data, version, 'yr_built', 'price' )
 
 #filters
-min_year_built = int(data['yr_built'].min())
-max_year_built = int(data['yr_built'].max())
+min_year_built, max_year_built = map(int, range_filter.bounds(year_index))
 
 st.sidebar.subheader('Select Max Year Built')
 f_year_built = st.sidebar.slider('Year Built', min_year_built, 
@@ -158,93 +152,117 @@ f_year_built = st.sidebar.slider('Year Built', min_year_built,
 st.header('Average Price per Year Built')
 
 # data selection
-df = data.loc[data['yr_built'] <= f_year_built]
-df = df[['yr_built', 'price']].groupby('yr_built').mean().reset_index()
+df = range_filter.group_means( year_index, f_year_built )
 
 # plot
-fig = px.line(df, x='yr_built', y='price')
-st.plotly_chart( fig, use_container_width=True)
+# figura em cache pelo filtro (figure_cache): mesma seleção, mesma figura
+with timing.section('yr_built figure'):
+    fig = figure_cache.figure( version, 'yr_built', f_year_built,
+                               lambda: px.line(df, x='yr_built', y='price') )
+figure_cache.show(st, fig, 'yr_built')
 
 
 # average price per day
 st.header('Average Price per Year Built')
 st.sidebar.subheader('Select Max Date')
 
+# série diária de preço médio, calculada uma vez por versão do dataset
+daily_price = time_series.daily( data, version, 'price' )
+
 # filters
-min_date = datetime.strptime(data['date'].min(),'%Y-%m-%d')
-max_date = datetime.strptime(data['date'].max(),'%Y-%m-%d')
+min_date, max_date = time_series.bounds(daily_price)
 
 f_date = st.sidebar.slider('Date', min_date, max_date, max_date)
 
 # data filtering
-data['date'] = pd.to_datetime(data['date'])
-df = data.loc[data['date'] <= f_date]
-df = df[['date', 'price']].groupby('date').mean().reset_index()
+df = time_series.until( daily_price, f_date )
 
-fig = px.line(df, x='date', y='price')
-st.plotly_chart( fig, use_container_width=True)
+with timing.section('date figure'):
+    fig = figure_cache.figure( version, 'date', f_date,
+                               lambda: px.line(df, x='date', y='price') )
+figure_cache.show(st, fig, 'date')
 
 # Histogram
 st.header('Price Distribution')
 st.sidebar.subheader('Select Max price')
 
+price_index = range_filter.column_index( data, version, 'price', 'price' )
+
 # filters
-min_price = int(data['price'].min())
-max_price = int(data['price'].max())
-avg_price = int(data['price'].mean())
+min_price, max_price = map(int, range_filter.bounds(price_index))
+avg_price = int(range_filter.mean(price_index))
 
 # data filtering
 f_price = st.sidebar.slider('Price', min_price, max_price, avg_price)
-df = data.loc[data['price'] <= f_price]
+df = range_filter.histogram( price_index, f_price, bins=50 )
+
+with timing.section('price figure'):
+    fig = figure_cache.figure( version, 'price', f_price,
+                               lambda: px.bar(df, x='price', y='count').update_layout(bargap=0) )
+figure_cache.show(st, fig, 'price')
 
-fig = px.histogram(df, x='price', nbins=50 )
-st.plotly_chart( fig, use_container_width=True)
+timing.lap('commercial')
 
 # Distribuição dos imoveis por categorias físicas
 st.header('Attributes Options')
 st.sidebar.subheader('House Attributes')
 
+bedrooms_index = range_filter.column_index( data, version, 'bedrooms' )
+bathrooms_index = range_filter.column_index( data, version, 'bathrooms' )
+floors_index = range_filter.column_index( data, version, 'floors' )
+waterfront_index = range_filter.column_index( data, version, 'waterfront' )
+
 # filters
 f_bedrooms = st.sidebar.selectbox('Max number of bedrooms',
-                                  sorted(set(data['bedrooms'].unique())))
+                                  bedrooms_index['keys'].tolist())
 f_bathrooms = st.sidebar.selectbox('Max number of bathrooms',
-                                  sorted(set(data['bathrooms'].unique())))
+                                  bathrooms_index['keys'].tolist())
 f_floors = st.sidebar.selectbox('Max number of floors',
-                                  sorted(set(data['floors'].unique())))
+                                  floors_index['keys'].tolist())
 f_waterview = st.sidebar.checkbox('Only houses with Water View')
 
 c1, c2 = st.columns((1,1))
 
 # House per bedrooms
 c1.header('Houses per bedrooms')
-df = data[ data['bedrooms'] <= f_bedrooms ]
-fig = px.histogram(df, x='bedrooms', nbins=19 )
-c1.plotly_chart( fig, use_container_width=True)
+df = range_filter.value_counts( bedrooms_index, f_bedrooms )
+with timing.section('bedrooms figure'):
+    fig = figure_cache.figure( version, 'bedrooms', f_bedrooms,
+                               lambda: px.histogram(df, x='bedrooms', y='count', nbins=19 ) )
+figure_cache.show(c1, fig, 'bedrooms')
 
 # House per bathrooms
 c2.header('Houses per bathrooms')
-df = data[ data['bathrooms'] <= f_bathrooms ]
-fig = px.histogram(df, x='bathrooms', nbins=19 )
-c2.plotly_chart( fig, use_container_width=True)
+df = range_filter.value_counts( bathrooms_index, f_bathrooms )
+with timing.section('bathrooms figure'):
+    fig = figure_cache.figure( version, 'bathrooms', f_bathrooms,
+                               lambda: px.histogram(df, x='bathrooms', y='count', nbins=19 ) )
+figure_cache.show(c2, fig, 'bathrooms')
 
 c1, c2 = st.columns((1,1))
 
 # House per floors
 c1.header('Houses per floor')
-df = data[ data['floors'] <= f_floors ]
-fig = px.histogram(df, x='floors', nbins=19 )
-c1.plotly_chart( fig, use_container_width=True)
+df = range_filter.value_counts( floors_index, f_floors )
+with timing.section('floors figure'):
+    fig = figure_cache.figure( version, 'floors', f_floors,
+                               lambda: px.histogram(df, x='floors', y='count', nbins=19 ) )
+figure_cache.show(c1, fig, 'floors')
 
 # House per water view
+df = range_filter.value_counts( waterfront_index )
 if f_waterview:
-    df = data[ data['waterfront'] == 1 ]
-    
-else:
-    df = data.copy()
+    df = df[ df['waterfront'] == 1 ]
 
 c2.header('Water Front Houses')
-fig = px.histogram(df, x='waterfront', nbins=10)
-c2.plotly_chart( fig, use_container_width=True)
+with timing.section('waterfront figure'):
+    fig = figure_cache.figure( version, 'waterfront', f_waterview,
+                               lambda: px.histogram(df, x='waterfront', y='count', nbins=10) )
+figure_cache.show(c2, fig, 'waterfront')
+timing.lap('attributes')
+
+# painel de tempos na barra lateral e exportação
+timing.finish( st )
 
 
 
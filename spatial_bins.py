@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import memo
+
+# Agregação espacial para o mapa de densidade: todos os imóveis são contados em
+# células quadradas de uma grade cujo lado depende do zoom (1/16 de tile, ~2 km no zoom 10).
+# Por célula: quantidade, preço médio e preço/sqft médio (price / sqft_lot, como
+# a coluna price_sqft do dashboard). Tudo vetorizado, em cache por versão e zoom.
+DEFAULT_ZOOM = 10
+CELLS_PER_TILE = 16
+
+
+def cell_size(zoom):
+    # lado da célula em graus
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+@memo.by_version
+def grid(data, version=None, zoom=DEFAULT_ZOOM):
+    size = cell_size(zoom)
+    lat = data['lat'].to_numpy(dtype='float64')
+    lon = data['long'].to_numpy(dtype='float64')
+    price = data['price'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_sqft = price / data['sqft_lot'].to_numpy(dtype='float64')
+
+    iy = np.floor(lat / size).astype('int64')
+    ix = np.floor(lon / size).astype('int64')
+    if not len(iy):
+        return pd.DataFrame(columns=['lat_min', 'lat_max', 'long_min', 'long_max', 'count', 'price', 'price_sqft'])
+
+    # chave única por célula (linha * largura + coluna, a partir do canto da grade)
+    key = (iy - iy.min()) * (ix.max() - ix.min() + 1) + (ix - ix.min())
+    cells, inverse = np.unique(key, return_inverse=True)
+    count = np.bincount(inverse, minlength=len(cells))
+    valid = np.isfinite(price_sqft)
+    sqft_count = np.bincount(inverse[valid], minlength=len(cells))
+
+    # canto sudoeste de cada célula, a partir de um ponto qualquer dela
+    point = np.zeros(len(cells), dtype='int64')
+    point[inverse] = np.arange(len(inverse))
+    south = iy[point] * size
+    west = ix[point] * size
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({'lat_min': south,
+                             'lat_max': south + size,
+                             'long_min': west,
+                             'long_max': west + size,
+                             'count': count,
+                             'price': np.bincount(inverse, weights=price, minlength=len(cells)) / count,
+                             'price_sqft': np.bincount(inverse[valid], weights=price_sqft[valid],
+                                                       minlength=len(cells)) / sqft_count})
+
+
+def geojson(cells):
+    # FeatureCollection com um retângulo por célula e os agregados nas propriedades
+    features = []
+    for r in cells.itertuples(index=False):
+        ring = [[r.long_min, r.lat_min], [r.long_max, r.lat_min], [r.long_max, r.lat_max],
+                [r.long_min, r.lat_max], [r.long_min, r.lat_min]]
+        features.append({'type': 'Feature',
+                         'properties': {'count': int(r.count),
+                                        'price': round(float(r.price), 2),
+                                        'price_sqft': round(float(r.price_sqft), 2)},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+import memo
+import zipcode_stats
+
+# Cubo de resumo por zipcode para a página de overview: para cada coluna numérica
+# guarda contagem, média, M2 (soma dos quadrados dos desvios), mínimo e máximo de
+# cada zipcode. Qualquer seleção de zipcodes é respondida combinando as linhas do
+# cubo; só a mediana lê os valores, e apenas dos zipcodes selecionados.
+
+
+def build_cube(data, version=None):
+    # as colunas numéricas entram na chave (ex.: price_sqft criada pelo set_feature)
+    return _build_cube(data, version, tuple(data.select_dtypes('number').columns))
+
+
+@memo.by_version
+def _build_cube(data, version, columns):
+    codes, categories = zipcode_stats.zipcode_codes(data)
+    n = len(categories)
+    columns = list(columns)
+
+    # linhas ordenadas por zipcode: o zipcode i ocupa order[offsets[i]:offsets[i + 1]]
+    order = np.argsort(codes, kind='stable')
+    count = np.bincount(codes, minlength=n)
+    offsets = np.concatenate(([0], np.cumsum(count)))
+
+    stats = {}
+    for col in columns:
+        values = data[col].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        c = np.bincount(codes[valid], minlength=n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(codes[valid], weights=values[valid], minlength=n) / c
+        dev = values[valid] - mean[codes[valid]]
+        m2 = np.bincount(codes[valid], weights=dev * dev, minlength=n)
+
+        lo = np.full(n, np.nan)
+        hi = np.full(n, np.nan)
+        has = count > 0
+        if has.any():
+            sorted_values = values[order]
+            lo[has] = np.fmin.reduceat(sorted_values, offsets[:-1][has])
+            hi[has] = np.fmax.reduceat(sorted_values, offsets[:-1][has])
+
+        stats[col] = pd.DataFrame({'count': c, 'mean': mean, 'm2': m2, 'min': lo, 'max': hi})
+
+    return {'zipcodes': categories,
+            'columns': columns,
+            'rows': count,
+            'order': order,
+            'offsets': offsets,
+            'stats': stats,
+            'median': {col: float(np.nanmedian(data[col].to_numpy(dtype='float64'))) for col in columns}}
+
+
+def _selected(cube, zipcodes):
+    if not zipcodes:
+        return np.arange(len(cube['zipcodes']))
+    idx = cube['zipcodes'].get_indexer(list(zipcodes))
+
+    return idx[idx >= 0]
+
+
+def rows(cube, zipcodes):
+    # posições (em ordem crescente) das linhas dos zipcodes selecionados
+    sel = _selected(cube, zipcodes)
+    offsets = cube['offsets']
+    parts = [cube['order'][offsets[i]:offsets[i + 1]] for i in sel]
+
+    return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype='int64')
+
+
+def combine(stats, sel):
+    # agrega grupos: média ponderada e M2 pela fórmula de Chan
+    s = stats.iloc[sel]
+    s = s[s['count'] > 0]
+    n = s['count'].sum()
+    if n == 0:
+        return {'count': 0, 'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan}
+
+    mean = (s['count'] * s['mean']).sum() / n
+    m2 = s['m2'].sum() + (s['count'] * (s['mean'] - mean) ** 2).sum()
+
+    return {'count': n,
+            'mean': mean,
+            'std': np.sqrt(m2 / (n - 1)) if n > 1 else np.nan,
+            'min': s['min'].min(),
+            'max': s['max'].max()}
+
+
+def averages(cube, zipcodes=None):
+    # tabela "Average Values": uma linha por zipcode selecionado
+    sel = _selected(cube, zipcodes)
+    sel = sel[cube['rows'][sel] > 0]
+    stats = cube['stats']
+
+    return pd.DataFrame({'ZIPCODE': np.asarray(cube['zipcodes'])[sel],
+                         'TOTAL HOUSES': stats['id']['count'].to_numpy()[sel],
+                         'PRICE': stats['price']['mean'].to_numpy()[sel],
+                         'SQFT LIVING': stats['sqft_living']['mean'].to_numpy()[sel],
+                         'PRICE/SQFT': stats['price_sqft']['mean'].to_numpy()[sel]})
+
+
+def describe(cube, data, zipcodes=None, columns=None):
+    # tabela "Statistic Descriptive" das colunas numéricas selecionadas
+    columns = [c for c in (columns or cube['columns']) if c in cube['stats']]
+    sel = _selected(cube, zipcodes)
+    positions = rows(cube, zipcodes) if zipcodes else None
+
+    records = []
+    for col in columns:
+        s = combine(cube['stats'][col], sel)
+        if positions is None:
+            median = cube['median'][col]
+        else:
+            median = float(np.nanmedian(data[col].to_numpy(dtype='float64')[positions])) if len(positions) else np.nan
+        records.append({'ATTRIBUTES': col, 'MAX': s['max'], 'MIN': s['min'], 'MEAN': s['mean'],
+                        'MEDIAN': median, 'STD': s['std']})
+
+    return pd.DataFrame(records, columns=['ATTRIBUTES', 'MAX', 'MIN', 'MEAN', 'MEDIAN', 'STD'])
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+import memo
+
+# Tabelas paginadas: só a janela visível de linhas (e as colunas pedidas) vai para
+# o navegador. A ordenação e o filtro por faixa usam um índice de ordenação por
+# coluna (argsort estável), calculado uma vez por versão da tabela.
+PAGE_SIZE = 100
+NO_SORT = '(ordem original)'
+
+
+def _sortable(s):
+    # categóricas ordenam pelos códigos (categorias já ordenadas no cache)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy()
+
+    return s.to_numpy()
+
+
+@memo.by_version(pool=memo.VIEWS)
+def sort_index(data, version=None, column=None):
+    return np.argsort(_sortable(data[column]), kind='stable')
+
+
+def between(data, order, column, low=None, high=None):
+    # posições (na ordem do índice) com low <= valor <= high, por busca binária
+    values = data[column].to_numpy()[order]
+    start = 0 if low is None else int(np.searchsorted(values, low, side='left'))
+    stop = len(order) if high is None else int(np.searchsorted(values, high, side='right'))
+
+    return order[start:stop]
+
+
+def window(data, positions, page, page_size=PAGE_SIZE, columns=None):
+    # linhas da página (1, 2, ...) e só as colunas pedidas
+    start = (page - 1) * page_size
+    rows = positions[start:start + page_size] if positions is not None else slice(start, start + page_size)
+    df = data.iloc[rows]
+
+    return df.loc[:, list(columns)] if columns else df
+
+
+def paginated(st, data, version=None, key='table', page_size=PAGE_SIZE, rows=None, columns=None, height=None):
+    # substitui st.dataframe(data): ordenação, faixa de valores e página no servidor.
+    # rows restringe a um recorte (posições em ordem crescente) sem copiar o frame
+    c1, c2, c3 = st.columns((2, 1, 1))
+    column = c1.selectbox('Ordenar por', [NO_SORT] + list(data.columns), key=key + '_sort')
+    descending = c2.checkbox('Decrescente', key=key + '_desc')
+
+    positions = rows
+    if column != NO_SORT:
+        positions = sort_index(data, version, column)
+        if rows is not None:
+            keep = np.zeros(len(data), dtype=bool)
+            keep[rows] = True
+            positions = positions[keep[positions]]
+        if pd.api.types.is_numeric_dtype(data[column].dtype) and len(positions):
+            values = data[column].to_numpy()
+            low, high = values[positions[0]].item(), values[positions[-1]].item()
+            r1, r2 = st.columns(2)
+            low = r1.number_input('{} de'.format(column), value=low, key=key + '_low')
+            high = r2.number_input('{} até'.format(column), value=high, key=key + '_high')
+            positions = between(data, positions, column, low, high)
+        if descending:
+            positions = positions[::-1]
+
+    total = len(data) if positions is None else len(positions)
+    pages = max(1, -(-total // page_size))
+    page = int(c3.number_input('Página (de {})'.format(pages), min_value=1, max_value=pages, value=1,
+                               key=key + '_page'))
+
+    df = window(data, positions, page, page_size, columns)
+    if height is None:
+        st.dataframe(df)
+    else:
+        st.dataframe(df, height=height)
+    first = (page - 1) * page_size
+    st.caption('Linhas {} a {} de {}'.format(min(first + 1, total), min(first + page_size, total), total))
+
+    return df
+
+
+def subversion(version, *parts):
+    # versão de uma tabela derivada (recorte, relatório), para a chave do índice
+    if version is None:
+        return None
+
+    return '|'.join([version] + [str(p) for p in parts])
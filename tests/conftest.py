@@ -0,0 +1,22 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    # cópia do csv: a ingestão acrescenta linhas ao arquivo
+    path = tmp_path / 'kc_house_data.csv'
+    shutil.copy(os.path.join(ROOT, 'kc_house_data.csv'), path)
+
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
@@ -0,0 +1,102 @@
+import os
+
+import pandas as pd
+import pytest
+
+import house_data
+
+
+def _manifest(path, clean, cache_dir):
+    return house_data._read_manifest(house_data._cache_path(path, clean, cache_dir))
+
+
+def _resales(path, rows, date):
+    # vendas novas de imóveis já gravados, no formato do csv
+    sales = pd.read_csv(path).iloc[rows].copy()
+    sales['date'] = date
+
+    return sales
+
+
+@pytest.mark.parametrize('clean', [True, False])
+def test_chunked_build_equals_single_pass(csv_path, cache_dir, clean):
+    manifest = house_data.build_cache_chunked(csv_path, clean=clean, cache_dir=cache_dir, chunksize=3000)
+    assert len(manifest['segments']) == 1
+    assert manifest['removed'] == 0
+
+    got = house_data.load_houses(csv_path, clean=clean, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(got, house_data.read_csv(csv_path, clean=clean))
+
+
+@pytest.mark.parametrize('clean', [True, False])
+def test_append_equals_rebuild(csv_path, cache_dir, clean):
+    for variant in (True, False):
+        house_data.load_houses(csv_path, clean=variant, cache_dir=cache_dir)
+
+    house_data.append_sales(csv_path, _resales(csv_path, slice(0, 5), '20200101T000000'), cache_dir=cache_dir)
+    assert len(_manifest(csv_path, clean, cache_dir)['segments']) == 2
+
+    got = house_data.load_houses(csv_path, clean=clean, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(got, house_data.read_csv(csv_path, clean=clean))
+
+
+def test_older_resale_is_rejected(csv_path, cache_dir):
+    for variant in (True, False):
+        house_data.load_houses(csv_path, clean=variant, cache_dir=cache_dir)
+    stored = house_data.load_houses(csv_path, clean=True, cache_dir=cache_dir).iloc[0]
+
+    changes = house_data.append_sales(csv_path, _resales(csv_path, [0], '20000101T000000'), cache_dir=cache_dir)
+    added, removed = changes['clean']
+    assert len(added) == 0
+    assert len(removed) == 0
+    # nos dados brutos a venda entra normalmente
+    assert len(changes['raw'][0]) == 1
+
+    data = house_data.load_houses(csv_path, clean=True, cache_dir=cache_dir)
+    kept = data.loc[data['id'] == stored['id']]
+    assert len(kept) == 1
+    pd.testing.assert_series_equal(kept.iloc[0], stored, check_names=False)
+    pd.testing.assert_frame_equal(data, house_data.read_csv(csv_path, clean=True))
+
+
+def test_newer_resale_replaces_stored_sale(csv_path, cache_dir):
+    house_data.load_houses(csv_path, clean=True, cache_dir=cache_dir)
+    stored = house_data.load_houses(csv_path, clean=True, cache_dir=cache_dir).iloc[0]
+
+    changes = house_data.append_sales(csv_path, _resales(csv_path, [0], '20200101T000000'), cache_dir=cache_dir)
+    added, removed = changes['clean']
+    assert list(added['id']) == [stored['id']]
+    assert list(removed['id']) == [stored['id']]
+    assert _manifest(csv_path, True, cache_dir)['removed'] == 1
+
+
+@pytest.mark.parametrize('clean', [True, False])
+def test_compact_preserves_data(csv_path, cache_dir, clean):
+    house_data.load_houses(csv_path, clean=clean, cache_dir=cache_dir)
+    house_data.append_sales(csv_path, _resales(csv_path, slice(0, 5), '20200101T000000'), cache_dir=cache_dir)
+    before = house_data.load_houses(csv_path, clean=clean, cache_dir=cache_dir)
+
+    manifest = house_data.compact(csv_path, clean=clean, cache_dir=cache_dir)
+    assert len(manifest['segments']) == 1
+    assert manifest['removed'] == 0
+    assert 'removed_file' not in manifest
+
+    pd.testing.assert_frame_equal(house_data.load_houses(csv_path, clean=clean, cache_dir=cache_dir), before)
+
+
+def test_append_rejects_stale_version(csv_path, cache_dir):
+    house_data.load_houses(csv_path, clean=True, cache_dir=cache_dir)
+    size = os.path.getsize(csv_path)
+
+    with pytest.raises(ValueError):
+        house_data.append_sales(csv_path, _resales(csv_path, [0], '20200101T000000'),
+                                cache_dir=cache_dir, version='0000000000000000:clean')
+    assert os.path.getsize(csv_path) == size
+
+
+def test_needs_compaction():
+    one = [{'name': 'seg-00000', 'rows': 100}]
+    assert not house_data.needs_compaction({'rows': 100, 'segments': one, 'removed': 0})
+    assert house_data.needs_compaction({'rows': 80, 'segments': one, 'removed': 20})
+    many = one * (house_data.COMPACT_SEGMENTS + 1)
+    assert house_data.needs_compaction({'rows': 100, 'segments': many, 'removed': 0})
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+import memo
+import range_filter
+
+# Séries diárias. As datas ficam em datetime64[D] do começo ao fim (nada de
+# strftime/strptime): a série é calculada uma vez por versão do dataset e serve
+# tanto os limites do slider quanto o gráfico filtrado, pelas funções de range_filter.
+
+
+def days(dates):
+    # datetime64[D] de uma coluna de datas (datetime64 ou ns desde a época em int64)
+    values = np.asarray(dates)
+    if values.dtype.kind != 'M':
+        values = values.astype('datetime64[ns]')
+
+    return values.astype('datetime64[D]')
+
+
+@memo.by_version
+def daily(data, version=None, value='price'):
+    # mesmo formato de range_filter.column_index, com um valor distinto por dia
+    keys, inverse = np.unique(days(data['date']), return_inverse=True)
+    count = np.bincount(inverse, minlength=len(keys))
+    total = np.bincount(inverse, weights=data[value].to_numpy(dtype='float64'), minlength=len(keys))
+
+    return {'column': 'date',
+            'keys': keys,
+            'count': count,
+            'cum_count': np.concatenate(([0], np.cumsum(count))),
+            'value': value,
+            'sum': total,
+            'cum_sum': np.concatenate(([0.0], np.cumsum(total)))}
+
+
+def bounds(series):
+    # primeiro e último dia como datetime, no formato que o st.slider espera
+    first, last = range_filter.bounds(series)
+
+    return pd.Timestamp(first).to_pydatetime(), pd.Timestamp(last).to_pydatetime()
+
+
+def until(series, date):
+    # média diária até date (inclusive)
+    return range_filter.group_means(series, np.datetime64(date, 'D'))
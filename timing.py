@@ -0,0 +1,113 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Tempos por seção de cada execução de página (cada sessão do streamlit roda o
+# script numa thread, então os registros são por thread). Seções podem ser
+# aninhadas e guardar o tamanho do que foi enviado ao navegador (bytes).
+# Com SEATLE_HOUSES_TIMINGS=arquivo.jsonl cada execução acrescenta uma linha JSON
+# por seção ao arquivo; o painel lateral mostra os tempos da execução atual.
+EXPORT_PATH = os.environ.get('SEATLE_HOUSES_TIMINGS')
+
+_local = threading.local()
+
+
+def start(page):
+    _local.page = page
+    _local.run = time.time()
+    _local.records = []
+    _local.depth = 0
+    _local.t0 = _local.mark = time.perf_counter()
+
+
+def records():
+    return list(getattr(_local, 'records', []))
+
+
+def _record(name, begin, end, nbytes=None, depth=None):
+    _local.records.append({'page': _local.page,
+                           'section': name,
+                           'depth': _local.depth if depth is None else depth,
+                           'start': begin - _local.t0,
+                           'seconds': end - begin,
+                           'bytes': nbytes})
+
+
+@contextmanager
+def section(name):
+    # with timing.section('mapa') as info: ...; info['bytes'] = len(html)
+    if not hasattr(_local, 'records'):
+        start(None)
+    info = {'bytes': None}
+    depth = _local.depth
+    _local.depth += 1
+    t = time.perf_counter()
+    try:
+        yield info
+    finally:
+        _local.depth = depth
+        end = time.perf_counter()
+        _record(name, t, end, info['bytes'], depth)
+        if depth == 0:
+            # lap() conta só o tempo fora das seções
+            _local.mark = end
+
+
+def timed(name):
+    # decorator: a função inteira vira uma seção
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def lap(name):
+    # para scripts corridos: tempo desde a marca anterior (ou do start)
+    if not hasattr(_local, 'records'):
+        start(None)
+    now = time.perf_counter()
+    _record(name, _local.mark, now)
+    _local.mark = now
+
+
+def export(path=EXPORT_PATH):
+    # uma linha JSON por seção, com o horário de início da execução
+    if not path:
+        return None
+
+    with open(path, 'a') as f:
+        for r in records():
+            f.write(json.dumps(dict(r, run=_local.run)) + '\n')
+
+    return path
+
+
+def panel(st):
+    # painel de depuração na barra lateral (st é passado para não importar o streamlit aqui)
+    if not st.sidebar.checkbox('Mostrar tempos das seções'):
+        return None
+
+    lines = []
+    for r in sorted(records(), key=lambda r: (r['start'], r['depth'])):
+        size = '' if r['bytes'] is None else ' ({:,.0f} KB)'.format(r['bytes'] / 1024)
+        lines.append('{}{}: {:.3f} s{}'.format('  ' * r['depth'], r['section'], r['seconds'], size))
+    st.sidebar.text('\n'.join(lines))
+
+    return None
+
+
+def finish(st=None):
+    # fim da execução: painel (se houver st) e exportação
+    if st is not None:
+        panel(st)
+
+    return export()
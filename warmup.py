@@ -0,0 +1,108 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+import hypotheses
+import maps
+import pricing
+import zipcode_pool
+import zipcode_stats
+
+# Pré-cálculo em segundo plano das páginas do project.py: logo depois do get_data
+# as tabelas de compra e venda, os mapas e o resumo dos insights são calculados
+# numa thread, uma vez por versão do dataset, e ficam no memo. Uma página só
+# espera (com aviso) pela tarefa de que depende se ela ainda não terminou; as
+# tarefas rodam em ordem numa única thread, então uma reaproveita a anterior.
+TASKS = []
+
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+
+def task(name):
+    def decorator(func):
+        TASKS.append((name, func))
+        return func
+
+    return decorator
+
+
+@task('zipcode pool')
+def _zipcode_pool(data, version, path):
+    return zipcode_pool.precompute(data, version, path)
+
+
+@task('purchase')
+def _purchase(data, version, path):
+    return zipcode_stats.purchase_candidates(data, version)
+
+
+@task('sales')
+def _sales(data, version, path):
+    return pricing.sales_recommendations(data, version)
+
+
+@task('purchase map')
+def _purchase_map(data, version, path):
+    return maps.cluster_map_html(zipcode_stats.purchase_candidates(data, version), maps.PURCHASE_POPUP)
+
+
+@task('sales map')
+def _sales_map(data, version, path):
+    return maps.cluster_map_html(pricing.sales_recommendations(data, version), maps.SALES_POPUP)
+
+
+@task('insights')
+def _insights(data, version, path):
+    return hypotheses.summary(data, version)
+
+
+def start(data, version=None, path='kc_house_data.csv'):
+    # agenda as tarefas da versão (só na primeira chamada); sem versão não há memo
+    global _executor
+    if version is None:
+        return None
+
+    with _lock:
+        if version not in _jobs:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='warmup')
+            # versões antigas já terminadas saem do registro
+            for old in [v for v, jobs in _jobs.items() if all(f.done() for f in jobs.values())]:
+                del _jobs[old]
+            _jobs[version] = {name: _executor.submit(func, data, version, path) for name, func in TASKS}
+
+        return _jobs[version]
+
+
+def progress(version=None):
+    # (tarefas terminadas, total) da versão
+    jobs = _jobs.get(version, {})
+
+    return sum(f.done() for f in jobs.values()), len(jobs)
+
+
+def wait(name, version=None, st=None):
+    # espera a tarefa (se agendada e ainda rodando) antes de a página ler o memo;
+    # erros da tarefa não sobem aqui: a página recalcula e mostra o erro normalmente
+    future = _jobs.get(version, {}).get(name)
+    if future is None or future.done():
+        return None
+
+    if st is None:
+        wait_futures([future])
+    else:
+        with st.spinner('Calculando {}...'.format(name)):
+            wait_futures([future])
+
+    return None
+
+
+def panel(st, version=None):
+    # progresso do pré-cálculo na barra lateral, enquanto houver tarefas pendentes
+    done, total = progress(version)
+    if total and done < total:
+        st.sidebar.progress(done / total)
+        st.sidebar.caption('Pré-calculando páginas: {} de {}'.format(done, total))
+
+    return None
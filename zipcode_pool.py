@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import house_data
+import memo
+import pricing
+import zipcode_stats
+
+# Execução paralela por zipcode. A mediana da região só depende dos imóveis do
+# próprio zipcode, então o dataset é dividido em grupos de zipcodes com número de
+# linhas parecido e cada grupo roda num processo. Os processos leem o cache
+# colunar mapeado em memória (as páginas do arquivo são as mesmas para todos) e
+# só copiam as linhas do seu grupo. Os resultados são juntados numa ordem fixa,
+# iguais aos do cálculo num processo só.
+# SEATLE_HOUSES_WORKERS define o número de processos (padrão: número de CPUs);
+# abaixo de MIN_ROWS linhas subir os processos custa mais que o cálculo.
+# Os processos partem de um forkserver: o build roda também na thread do warmup,
+# e um fork do processo do streamlit (com outras threads) pode herdar travas presas.
+WORKERS = int(os.environ.get('SEATLE_HOUSES_WORKERS', 0)) or os.cpu_count() or 1
+MIN_ROWS = 200_000
+
+
+def partitions(data, n):
+    # grupos de zipcodes com número de linhas parecido (maior zipcode primeiro)
+    codes, categories = zipcode_stats.zipcode_codes(data)
+    count = np.bincount(codes, minlength=len(categories))
+    groups = [[] for _ in range(max(1, min(n, len(categories))))]
+    load = np.zeros(len(groups))
+    for i in np.argsort(-count, kind='stable'):
+        g = int(np.argmin(load))
+        groups[g].append(categories[i])
+        load[g] += count[i]
+
+    return [g for g in groups if g]
+
+
+# Tarefas: cada uma roda sobre um grupo de zipcodes (ou o dataset todo) e tem uma
+# função que junta os resultados dos grupos.
+def purchase(data, version=None):
+    return zipcode_stats.purchase_candidates(data, version)
+
+
+def sales(data, version=None):
+    return pricing.sales_recommendations(data, version)
+
+
+def zipcodes(data, version=None):
+    # estatísticas só dos zipcodes presentes no grupo
+    index = zipcode_stats.zipcode_index(data, version)
+
+    return index[index['count'] > 0]
+
+
+def seasons(data, version=None):
+    # soma e contagem de preço por estação, para a média geral
+    season = pd.Series(pricing.seasons(data['date']))
+    price = data['price'].to_numpy(dtype='float64')
+
+    return pd.DataFrame({'price': price, 'seasons': season}).groupby('seasons')['price'].agg(['sum', 'count'])
+
+
+def _merge_purchase(results, data):
+    return pd.concat(results).sort_index()
+
+
+def _merge_sales(results, data):
+    # mesma ordem do relatório: maior % de lucro primeiro, empates na ordem dos dados
+    df = pd.concat(results)
+
+    return df.iloc[np.lexsort((df.index.to_numpy(), -df['percent_profit'].to_numpy()))]
+
+
+def _merge_zipcodes(results, data):
+    # de volta à ordem das categorias do dataset (linha i = código i)
+    _, categories = zipcode_stats.zipcode_codes(data)
+    index = pd.concat(results).set_index('zipcode').reindex(categories)
+    for col in ('count', 'price_sum', 'price_sqft_sum', 'sqft_living_sum'):
+        index[col] = index[col].fillna(0)
+    index['count'] = index['count'].astype('int64')
+
+    return index.rename_axis('zipcode').reset_index()
+
+
+def _merge_seasons(results, data):
+    return pd.concat(results).groupby(level=0).sum()
+
+
+TASKS = {'purchase': (purchase, _merge_purchase),
+         'sales': (sales, _merge_sales),
+         'zipcodes': (zipcodes, _merge_zipcodes),
+         'seasons': (seasons, _merge_seasons)}
+
+
+def _run_part(path, clean, derived, version, names, group):
+    data = dataset.Dataset(house_data.load_houses(path, clean=clean)).view(*derived)
+    codes, categories = zipcode_stats.zipcode_codes(data)
+    part = data.loc[np.isin(codes, categories.get_indexer(group))]
+
+    # versão própria do grupo: a tabela de venda reaproveita a de compra (memo)
+    # dentro do processo, que só vive durante esta execução
+    version = '{}|{}'.format(version, ','.join(map(str, group)))
+
+    return {name: TASKS[name][0](part, version) for name in names}
+
+
+def build(data, version=None, path='kc_house_data.csv', clean=True, workers=None, names=('purchase', 'sales')):
+    # resultados das tarefas pedidas; data é o dataset carregado de path (mesmo clean)
+    if workers is None:
+        workers = WORKERS if len(data) >= MIN_ROWS else 1
+
+    if workers == 1:
+        return {name: TASKS[name][0](data, version) for name in names}
+
+    parts = partitions(data, workers)
+    derived = [c for c in data.columns if c in dataset.DERIVED]
+    n = len(parts)
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(min(workers, n), mp_context=context) as pool:
+        results = list(pool.map(_run_part, [path] * n, [clean] * n, [derived] * n, [version] * n,
+                                [names] * n, parts))
+
+    return {name: TASKS[name][1]([r[name] for r in results], data) for name in names}
+
+
+@memo.by_version
+def precompute(data, version=None, path='kc_house_data.csv', clean=True):
+    # calcula em paralelo e grava no memo as tabelas que as páginas pedem, na
+    # mesma chave que elas usam; com poucos dados as páginas calculam sozinhas
+    if version is None or WORKERS == 1 or len(data) < MIN_ROWS:
+        return None
+
+    result = build(data, version, path, clean, names=('purchase', 'sales', 'zipcodes'))
+    memo.store(zipcode_stats.purchase_candidates, version, result['purchase'])
+    memo.store(pricing.sales_recommendations, version, result['sales'])
+    memo.store(zipcode_stats.zipcode_index, version, result['zipcodes'])
+
+    return result
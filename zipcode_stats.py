@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+import memo
+
+# critérios de compra
+MEDIAN_FACTOR = 0.9
+MIN_CONDITION = 3
+
+
+def zipcode_codes(data):
+    # código inteiro de cada linha no índice de zipcodes (categorias ordenadas)
+    zipcode = data['zipcode']
+    if isinstance(zipcode.dtype, pd.CategoricalDtype):
+        return zipcode.cat.codes.to_numpy(), zipcode.cat.categories
+
+    categories, codes = np.unique(zipcode.to_numpy(), return_inverse=True)
+
+    return codes, pd.Index(categories)
+
+
+def group_median(codes, values, n_groups):
+    # mediana exata por grupo: ordena por (grupo, valor) e pega o(s) elemento(s) do meio
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    count = np.bincount(codes, minlength=n_groups)
+    start = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+    median = np.full(n_groups, np.nan)
+    has = count > 0
+    lo = start[has] + (count[has] - 1) // 2
+    hi = start[has] + count[has] // 2
+    median[has] = (sorted_values[lo] + sorted_values[hi]) / 2
+
+    return median
+
+
+def _sums(codes, data, n):
+    # contagem e somas por zipcode (decomponíveis: permitem atualização incremental)
+    price = data['price'].to_numpy(dtype='float64')
+    price_sqft = price / data['sqft_lot'].to_numpy(dtype='float64')
+    sqft_living = data['sqft_living'].to_numpy(dtype='float64')
+
+    return {'count': np.bincount(codes, minlength=n),
+            'price_sum': np.bincount(codes, weights=price, minlength=n),
+            'price_sqft_sum': np.bincount(codes, weights=price_sqft, minlength=n),
+            'sqft_living_sum': np.bincount(codes, weights=sqft_living, minlength=n)}
+
+
+def _index_frame(categories, median, sums):
+    count = sums['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({'zipcode': categories,
+                             'median_price': median,
+                             'mean_price': sums['price_sum'] / count,
+                             'count': count,
+                             'price_sqft': sums['price_sqft_sum'] / count,
+                             'sqft_living': sums['sqft_living_sum'] / count,
+                             'price_sum': sums['price_sum'],
+                             'price_sqft_sum': sums['price_sqft_sum'],
+                             'sqft_living_sum': sums['sqft_living_sum']})
+
+
+@memo.by_version
+def zipcode_index(data, version=None):
+    # estatísticas por zipcode na ordem das categorias: a linha i corresponde ao código i
+    codes, categories = zipcode_codes(data)
+    n = len(categories)
+    median = group_median(codes, data['price'].to_numpy(dtype='float64'), n)
+
+    return _index_frame(categories, median, _sums(codes, data, n))
+
+
+def update_index(index, data, added, removed):
+    # índice do dataset novo a partir do anterior: soma as vendas acrescentadas,
+    # subtrai as substituídas e recalcula a mediana só dos zipcodes afetados
+    codes, categories = zipcode_codes(data)
+    n = len(categories)
+    old = index.set_index('zipcode').reindex(categories)
+
+    sums = {'count': old['count'].fillna(0).to_numpy(dtype='int64')}
+    for col in ('price_sum', 'price_sqft_sum', 'sqft_living_sum'):
+        sums[col] = old[col].fillna(0).to_numpy(dtype='float64')
+
+    for rows, sign in ((added, 1), (removed, -1)):
+        if len(rows):
+            rows_codes = categories.get_indexer(np.asarray(rows['zipcode']))
+            for col, delta in _sums(rows_codes, rows, n).items():
+                sums[col] += sign * delta
+
+    median = old['median_price'].to_numpy(dtype='float64').copy()
+    touched = np.unique(categories.get_indexer(np.concatenate([np.asarray(added['zipcode']),
+                                                                np.asarray(removed['zipcode'])])))
+    if len(touched):
+        mask = np.isin(codes, touched)
+        median[touched] = group_median(codes[mask], data['price'].to_numpy(dtype='float64')[mask], n)[touched]
+
+    return _index_frame(categories, median, sums)
+
+
+def lookup(data, column, version=None):
+    # valor da estatística do zipcode de cada linha, sem merge
+    codes, _ = zipcode_codes(data)
+
+    return zipcode_index(data, version)[column].to_numpy()[codes]
+
+
+def select_candidates(data, median):
+    # condição >= 3 e preço <= 90% da mediana da região (median: uma por linha)
+    mask = (data['price'].to_numpy() <= median * MEDIAN_FACTOR) & (data['condition'].to_numpy() >= MIN_CONDITION)
+
+    df = data.loc[mask].copy()
+    df['median_price_region'] = median[mask]
+
+    return df
+
+
+@memo.by_version
+def purchase_candidates(data, version=None):
+    # imóveis recomendados para compra: condição >= 3 e preço <= 90% da mediana da região
+    return select_candidates(data, lookup(data, 'median_price', version))